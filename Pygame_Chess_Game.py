@@ -2,7 +2,13 @@ import pygame
 from chess_game_agent import ChessAgent
 from chess_pieces import Pawn, Knight, Bishop, Rook, Queen, King
 from chess_game_popup import show_popup
-from chess_game_agent import ChessAgent
+from chess_bitboard import (
+    BitboardPosition,
+    LOCATION_BITS,
+    squareFromLocation,
+    locationFromSquare,
+)
+from chess_tables import BETWEEN
 
 # Initialising the PyGame environment
 pygame.init()
@@ -51,6 +57,10 @@ class ChessGame:
         # Creating the pieces for each player
         self.generateChessPieces(player1, 1)
         self.generateChessPieces(player2, 2)
+        # Creating the bitboard position of the pieces
+        self.board = BitboardPosition.fromPieces(
+            player1.chessPieces + player2.chessPieces
+        )
         # Initialising whose turn it is to play
         self.playerTurn = player1
         # Keeping track of the moveNmb within the game
@@ -266,19 +276,13 @@ class ChessGame:
 
         return allPossibleMoves
 
-    # Function which checks whether an opponents piece has a location as a blocker, as whether it would be able to attack that location or not
+    # Function which checks whether an opponents piece could attack a location, if the king moved there
     def checkOpponentBlockers(self, opponentPieces, location):
-        # Going through all the opponents pieces
+        square = squareFromLocation(location)
+        # Going through all the opponents pieces, and checking their attacks using the precomputed tables
         for piece in opponentPieces:
-            # Checking if a blocker exists at the location we are checking for
-            blockerExists = piece.checkForBlocker(location)
-            if blockerExists:
-                # Checking whether any of the piece's moves could reach the location, if the blocker didn't exist
-                for move in piece.actions:
-                    new_pos = (piece.location[0] + move[0], piece.location[1] + move[1])
-                    if new_pos == location:
-                        # If it could, return True
-                        return True
+            if piece.location != location and piece.attacksSquare(self.board, square):
+                return True
         return False
 
     # Function to identify all the moves that attack a specified location (usually used for the king)
@@ -312,32 +316,15 @@ class ChessGame:
         return attackingPieces  # Returning all pieces that can attack the king
 
     def blockedMove(self, opposingPlayer, location, attackerLocation, blockerLocation):
-        ax, ay = attackerLocation
-        kx, ky = location
-        bx, by = blockerLocation
-
-        dx, dy = kx - ax, ky - ay
-
-        # Normalize direction to unit step
-        def sign(n):
-            return (n > 0) - (n < 0)
-
-        step_x = sign(dx)
-        step_y = sign(dy)
-
         if blockerLocation == attackerLocation:
             return True  # Same square
 
-        # Build path from attacker to target
-        cx, cy = ax + step_x, ay + step_y
-        while (cx, cy) != (kx, ky):
-            # If the blocker location is identified within the path, attack blocked
-            if (cx, cy) == (bx, by):
-                return True
-            cx += step_x
-            cy += step_y
-
-        return False
+        # Checking whether the blocker location is within the path from the attacker to the target
+        return (
+            BETWEEN[squareFromLocation(attackerLocation)][squareFromLocation(location)]
+            & LOCATION_BITS[blockerLocation]
+            != 0
+        )
 
     # Function to change the color of a rectangle at a positon in the chess grid to a specific colour
     def changeGridSpaceColor(self, gridSpace, color):
@@ -366,40 +353,11 @@ class ChessGame:
 
     # Function to identify the possible moves a piece can make
     def identifyPossibleMoves(self, piece, playerPieces, opponentPieces):
-        possibleMoves = []
-        allPieceActions = piece.actions + piece.getSpecialMoves(
-            playerPieces, opponentPieces
+        # Getting the squares the piece can move to, from the precomputed tables
+        moveSquares = piece.getMoveSquares(self.board) + piece.getSpecialMoves(
+            self.board, playerPieces, opponentPieces
         )
-        for action in allPieceActions:
-            if piece.color == "white":
-                # Multiplying the action by -1 as we are moving in the opposite direction, up the board
-                action = (action[0] * -1, action[1] * -1)
-            new_pos = (piece.location[0] + action[0], piece.location[1] + action[1])
-            # Ensuring the (x,y) values are between 1 and 8
-            if 1 <= new_pos[0] <= 8 and 1 <= new_pos[1] <= 8:
-                # Ensuring that none of the player's pieces are located at the new moves location
-                if all(pPiece.location != new_pos for pPiece in playerPieces):
-                    # Implement the code to check for blockers here, and reject if necessary
-                    # Not implementing checks for Knights, as they can't be blocked
-                    if type(piece) != Knight:
-                        # Calculating the blocker locations for the current piece
-                        piece.checkBlockerLocations(
-                            player1.chessPieces + player2.chessPieces
-                        )
-                        # Calculating the direction of the current action
-                        tempAction = action
-                        # Reverting back the action, so we can determine the correct way the piece is moving
-                        if piece.color == "white":
-                            tempAction = (tempAction[0] * -1, tempAction[1] * -1)
-                        direction = piece.getDirectionFromAction(tempAction)
-                        # Determining whether the move is blocked or not
-                        blocked = piece.checkBlockedMove(new_pos, direction)
-                        # If the move is blocked, move to the next action
-                        if blocked:
-                            continue
-                    # If no blockers, add the move to possible moves
-                    possibleMoves.append([piece, new_pos])
-        return possibleMoves
+        return [[piece, locationFromSquare(square)] for square in moveSquares]
 
     # Function to get the current moves that a piece can make, given the piece and all the possible actions the player could make
     def getPossibleMoves(self, piece, allPossibleMoves):
@@ -452,6 +410,13 @@ class ChessGame:
             action[0] - self.currentPiece.location[0],
             action[1] - self.currentPiece.location[1],
         )
+        # Removing any captured piece from the board, before moving onto its location
+        capturedIdx = self.board.pieceIdxAt(action)
+        if capturedIdx is not None:
+            self.board.removePiece(capturedIdx, action)
+        self.board.movePiece(
+            self.currentPiece.tensor_idx, self.currentPiece.location, action
+        )
         self.currentPiece.location = action  # Moving the piece to the location'
 
         # If the current piece tracks self.moved and hasn't been moved yet, update it
@@ -485,10 +450,12 @@ class ChessGame:
                     if isinstance(piece, Rook)
                     and piece.location[0] == self.currentPiece.location[0] - 2
                 ][0]
-                rook.location = (
+                newRookLocation = (
                     self.currentPiece.location[0] + 1,
                     self.currentPiece.location[1],
                 )
+                self.board.movePiece(rook.tensor_idx, rook.location, newRookLocation)
+                rook.location = newRookLocation
             elif movement == (2, 0):
                 # Kingside castling
                 rook = [
@@ -497,10 +464,12 @@ class ChessGame:
                     if isinstance(piece, Rook)
                     and piece.location[0] == self.currentPiece.location[0] + 1
                 ][0]
-                rook.location = (
+                newRookLocation = (
                     self.currentPiece.location[0] - 1,
                     self.currentPiece.location[1],
                 )
+                self.board.movePiece(rook.tensor_idx, rook.location, newRookLocation)
+                rook.location = newRookLocation
 
         # Checking whether the move has captured any pieces
         for chessPiece in opponentPieces:
@@ -550,6 +519,8 @@ class ChessGame:
         # Replace the pawn with the new piece
         self.playerTurn.chessPieces.remove(self.currentPiece)
         self.playerTurn.chessPieces.append(new_piece)
+        self.board.removePiece(self.currentPiece.tensor_idx, (x, y))
+        self.board.addPiece(new_piece.tensor_idx, (x, y))
 
 
 if __name__ == "__main__":
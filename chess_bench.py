@@ -0,0 +1,124 @@
+from chess_game_environment import ChessGameAI
+from chess_game_agent import ChessAgent, playMove
+from chess_metrics import PhaseTimers
+import numpy as np
+import torch
+import argparse
+import json
+import platform
+import random
+import resource
+import subprocess
+import time
+
+
+# Function to get the commit the code is running from, so results can be compared across commits
+def currentCommit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# Function to get the peak memory used by the process so far, in MB
+def peakRssMb():
+    # ru_maxrss is in kilobytes on Linux, and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if platform.system() == "Darwin" else 1024)
+
+
+# Function to play a fixed number of seeded, headless games between two agents, timing every phase
+# Games still going after maxMoves moves are stopped, so every run plays a bounded number of moves
+# If training, the agents train and remember as they do in train()
+def runBench(numGames=5, maxMoves=200, training=True, seed=0):
+    random.seed(seed)
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+
+    player1 = ChessAgent()
+    player2 = ChessAgent()
+    game = ChessGameAI(player1, player2, headless=True)
+    timers = PhaseTimers()
+    player1.timers = player2.timers = game.timers = timers
+
+    startTime = time.perf_counter()
+    for _ in range(numGames):
+        for _ in range(maxMoves):
+            currentPlayer, checkmate = playMove(
+                game, player1, player2, timers, training
+            )
+            if checkmate:
+                break
+        if training:
+            with timers.time("train_long_memory"):
+                player1.train_long_memory()
+                player2.train_long_memory()
+        timers.count("games")
+        player1.n_games += 1
+        player2.n_games += 1
+        game.reset()
+    elapsed = time.perf_counter() - startTime
+
+    snapshot = timers.snapshot()
+    plies = snapshot["counters"].get("moves", 0)
+    return {
+        "commit": currentCommit(),
+        "time": time.time(),
+        "games": numGames,
+        "maxMoves": maxMoves,
+        "training": training,
+        "seed": seed,
+        "plies": plies,
+        "seconds": elapsed,
+        "pliesPerSec": plies / elapsed,
+        "gamesPerSec": numGames / elapsed,
+        "peakRssMb": peakRssMb(),
+        "phases": snapshot["phases"],
+        "python": platform.python_version(),
+        "torch": torch.__version__,
+    }
+
+
+# Function to print a summary of a benchmark result
+def printResult(result):
+    print(
+        f"{result['games']} games, {result['plies']} plies in {result['seconds']:.2f}s "
+        f"(training {'on' if result['training'] else 'off'}, seed {result['seed']})"
+    )
+    print(
+        f"{result['pliesPerSec']:.1f} plies/sec, {result['gamesPerSec']:.3f} games/sec, "
+        f"peak RSS {result['peakRssMb']:.0f} MB"
+    )
+    for name, phase in sorted(
+        result["phases"].items(), key=lambda item: -item[1]["seconds"]
+    ):
+        print(
+            f"  {name:<20} {phase['seconds']:8.3f}s  {phase['calls']:>7} calls  "
+            f"{phase['meanMs']:8.3f} ms/call  {phase['share'] * 100:5.1f}%"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="End-to-end self-play benchmark")
+    parser.add_argument("--games", type=int, default=5)
+    parser.add_argument("--max-moves", type=int, default=200, help="Moves per game")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--no-train", action="store_true", help="Only play, without training"
+    )
+    parser.add_argument(
+        "--output",
+        default="bench.jsonl",
+        help="File the result is appended to, as one JSON line",
+    )
+    args = parser.parse_args()
+
+    result = runBench(args.games, args.max_moves, not args.no_train, args.seed)
+    printResult(result)
+    with open(args.output, "a") as file:
+        file.write(json.dumps(result) + "\n")
@@ -0,0 +1,316 @@
+import random
+from chess_tables import (
+    DIRECTION_OFFSETS,
+    ROOK_DIRECTIONS,
+    BISHOP_DIRECTIONS,
+    QUEEN_DIRECTIONS,
+    KNIGHT_ATTACKS,
+    KING_ATTACKS,
+    PAWN_ATTACKS,
+    RAYS,
+    DIRECTION_BETWEEN,
+    BETWEEN,
+)
+
+# Defining the color indexes used for the occupancy bitboards
+COLOR_INDEX = {"white": 0, "black": 1}
+
+# Index of each piece type within each colors block of piece bitboards (e.g. 5 white king, 11 black king)
+PAWN_IDX, KNIGHT_IDX, BISHOP_IDX, ROOK_IDX, QUEEN_IDX, KING_IDX = range(6)
+
+# Defining the directions each piece type slides in, indexed by piece type (empty if it can't slide)
+SLIDER_DIRECTIONS = [(), (), BISHOP_DIRECTIONS, ROOK_DIRECTIONS, QUEEN_DIRECTIONS, ()]
+
+# Indexes of the sliding pieces (bishops, rooks and queens) of both colors
+SLIDER_IDXS = tuple(idx for idx in range(12) if SLIDER_DIRECTIONS[idx % 6])
+
+# Whether moving along a direction increases the square index, so the nearest blocker is the lowest bit
+INCREASING_DIRECTIONS = [dx + dy * 8 > 0 for dx, dy in DIRECTION_OFFSETS]
+
+# Precomputing the bit for every location on the board, (1,1) --> bit 0 and (8,8) --> bit 63
+# Locations off the board aren't in the dictionary, so .get() returns 0 for them
+LOCATION_BITS = {
+    (x, y): 1 << ((x - 1) + (y - 1) * 8) for x in range(1, 9) for y in range(1, 9)
+}
+
+
+# Defining the castling rights bits, white's back rank is y = 8 and black's is y = 1
+WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE = 1, 2, 4, 8
+ALL_CASTLING_RIGHTS = 15
+# The (piece index, location) of the king and rook each castling right depends on
+CASTLING_PIECES = {
+    WHITE_KINGSIDE: ((5, (5, 8)), (3, (8, 8))),
+    WHITE_QUEENSIDE: ((5, (5, 8)), (3, (1, 8))),
+    BLACK_KINGSIDE: ((11, (5, 1)), (9, (8, 1))),
+    BLACK_QUEENSIDE: ((11, (5, 1)), (9, (1, 1))),
+}
+# Rights kept when a piece moves from or to each square (moving a king or rook, or capturing a rook)
+CASTLING_MASKS = [ALL_CASTLING_RIGHTS] * 64
+for _right, _pieces in CASTLING_PIECES.items():
+    for _pieceIdx, _location in _pieces:
+        CASTLING_MASKS[(_location[0] - 1) + (_location[1] - 1) * 8] &= ~_right
+
+# Random numbers used for Zobrist hashing, seeded so hashes are the same on every run
+_zobristRandom = random.Random(2024)
+ZOBRIST_PIECES = [
+    [_zobristRandom.getrandbits(64) for _ in range(64)] for _ in range(12)
+]
+ZOBRIST_CASTLING = [_zobristRandom.getrandbits(64) for _ in range(16)]
+ZOBRIST_BLACK_TO_MOVE = _zobristRandom.getrandbits(64)
+
+
+# Function to convert a (x,y) location into a square index (0-63)
+def squareFromLocation(location):
+    return (location[0] - 1) + (location[1] - 1) * 8
+
+
+# Function to convert a square index (0-63) back into a (x,y) location
+def locationFromSquare(square):
+    return (square % 8 + 1, square // 8 + 1)
+
+
+# Function to get the squares a sliding piece attacks, stopping each ray at the first occupied square
+def slidingAttacks(square, directions, occupied):
+    attacks = 0
+    for direction in directions:
+        ray = RAYS[direction][square]
+        blockers = ray & occupied
+        if blockers:
+            # Finding the nearest blocker and cutting off the ray behind it
+            if INCREASING_DIRECTIONS[direction]:
+                blocker = (blockers & -blockers).bit_length() - 1
+            else:
+                blocker = blockers.bit_length() - 1
+            ray ^= RAYS[direction][blocker]
+        attacks |= ray
+    return attacks
+
+
+# Function to get the squares attacked by a piece on a square, given the occupied squares
+def pieceAttacks(pieceIdx, square, occupied):
+    pieceType = pieceIdx % 6
+    if pieceType == PAWN_IDX:
+        return PAWN_ATTACKS[pieceIdx // 6][square]
+    if pieceType == KNIGHT_IDX:
+        return KNIGHT_ATTACKS[square]
+    if pieceType == KING_IDX:
+        return KING_ATTACKS[square]
+    return slidingAttacks(square, SLIDER_DIRECTIONS[pieceType], occupied)
+
+
+# Function to get the squares of all the set bits within a bitboard
+def bitboardSquares(bitboard):
+    squares = []
+    while bitboard:
+        bit = bitboard & -bitboard
+        squares.append(bit.bit_length() - 1)
+        bitboard ^= bit
+    return squares
+
+
+# Class to store the position of all the pieces on the board as 64 bit integers
+# Each piece type and color has its own bitboard, indexed by the piece's tensor_idx
+class BitboardPosition:
+    def __init__(self):
+        # One bitboard for every piece type and color (0-5 white, 6-11 black)
+        self.pieceBitboards = [0] * 12
+        # One bitboard for all the pieces of each color (0 white, 1 black)
+        self.colorBitboards = [0, 0]
+        # Bitboard of every occupied square on the board
+        self.occupied = 0
+        # Index of the piece on every square of the board (None if empty)
+        self.squares = [None] * 64
+        # Square of each colors king, so it never has to be searched for
+        self.kingSquares = [None, None]
+        # Bitboard of the squares attacked by the piece on every square, updated on every change
+        self.attacks = [0] * 64
+        # Squares attacked by each color, rebuilt from self.attacks only when they are read
+        self.attackMaps = [0, 0]
+        self.attackMapsValid = True
+        # Castling rights still available (see WHITE_KINGSIDE etc.)
+        self.castlingRights = 0
+        # Zobrist hash of the pieces and castling rights, updated on every change
+        self.zobristHash = ZOBRIST_CASTLING[0]
+
+    # Function to create a position from a list of chess pieces
+    @classmethod
+    def fromPieces(cls, gamePieces):
+        board = cls()
+        for piece in gamePieces:
+            board.addPiece(piece.tensor_idx, piece.location)
+
+        # A castling right is available while its king and rook haven't moved from their squares
+        unmovedPieces = {
+            (piece.tensor_idx, piece.location)
+            for piece in gamePieces
+            if getattr(piece, "moved", True) is False
+        }
+        castlingRights = 0
+        for right, pieces in CASTLING_PIECES.items():
+            if all(piece in unmovedPieces for piece in pieces):
+                castlingRights |= right
+        board.setCastlingRights(castlingRights)
+        return board
+
+    # Function to set the castling rights, updating the hash
+    def setCastlingRights(self, castlingRights):
+        self.zobristHash ^= (
+            ZOBRIST_CASTLING[self.castlingRights] ^ ZOBRIST_CASTLING[castlingRights]
+        )
+        self.castlingRights = castlingRights
+
+    # Function to get the hash of the position with a color to move, used as a cache key
+    def positionKey(self, color):
+        if color == "black":
+            return self.zobristHash ^ ZOBRIST_BLACK_TO_MOVE
+        return self.zobristHash
+
+    # Function to add a piece to the board
+    def addPiece(self, pieceIdx, location):
+        bit = LOCATION_BITS[location]
+        self.pieceBitboards[pieceIdx] |= bit
+        self.colorBitboards[pieceIdx // 6] |= bit
+        self.occupied |= bit
+        square = squareFromLocation(location)
+        self.squares[square] = pieceIdx
+        if pieceIdx % 6 == KING_IDX:
+            self.kingSquares[pieceIdx // 6] = square
+        self.zobristHash ^= ZOBRIST_PIECES[pieceIdx][square]
+        # Updating the attacks of the new piece, and any sliders it now blocks
+        self.updateSliderAttacks(bit)
+        self.attacks[square] = pieceAttacks(pieceIdx, square, self.occupied)
+
+    # Function to remove a piece from the board
+    def removePiece(self, pieceIdx, location):
+        bit = LOCATION_BITS[location]
+        self.pieceBitboards[pieceIdx] &= ~bit
+        self.colorBitboards[pieceIdx // 6] &= ~bit
+        self.occupied &= ~bit
+        square = squareFromLocation(location)
+        self.squares[square] = None
+        if pieceIdx % 6 == KING_IDX:
+            self.kingSquares[pieceIdx // 6] = None
+        self.zobristHash ^= ZOBRIST_PIECES[pieceIdx][square]
+        # Removing the piece's attacks, and extending any sliders it was blocking
+        self.attacks[square] = 0
+        self.updateSliderAttacks(bit)
+
+    # Function to move a piece from one location to another
+    # NOTE : Any piece captured at the new location needs to be removed beforehand
+    def movePiece(self, pieceIdx, oldLocation, newLocation):
+        moveBits = LOCATION_BITS[oldLocation] | LOCATION_BITS[newLocation]
+        self.pieceBitboards[pieceIdx] ^= moveBits
+        self.colorBitboards[pieceIdx // 6] ^= moveBits
+        self.occupied ^= moveBits
+        oldSquare = squareFromLocation(oldLocation)
+        newSquare = squareFromLocation(newLocation)
+        self.squares[oldSquare] = None
+        self.squares[newSquare] = pieceIdx
+        if pieceIdx % 6 == KING_IDX:
+            self.kingSquares[pieceIdx // 6] = newSquare
+        self.zobristHash ^= (
+            ZOBRIST_PIECES[pieceIdx][oldSquare] ^ ZOBRIST_PIECES[pieceIdx][newSquare]
+        )
+        # Only the moved piece and the sliders passing through either square change their attacks
+        self.attacks[oldSquare] = 0
+        self.updateSliderAttacks(moveBits)
+        self.attacks[newSquare] = pieceAttacks(pieceIdx, newSquare, self.occupied)
+
+    # Function to recalculate the attacks of the sliders whose rays reach any of the changed squares
+    def updateSliderAttacks(self, changedBits):
+        sliders = 0
+        for pieceIdx in SLIDER_IDXS:
+            sliders |= self.pieceBitboards[pieceIdx]
+        for square in bitboardSquares(sliders):
+            if self.attacks[square] & changedBits:
+                self.attacks[square] = slidingAttacks(
+                    square, SLIDER_DIRECTIONS[self.squares[square] % 6], self.occupied
+                )
+        self.attackMapsValid = False
+
+    # Function to get the bitboard of all the squares attacked by a color
+    def getAttackMap(self, color):
+        if not self.attackMapsValid:
+            for colorIdx in (0, 1):
+                attackMap = 0
+                for square in bitboardSquares(self.colorBitboards[colorIdx]):
+                    attackMap |= self.attacks[square]
+                self.attackMaps[colorIdx] = attackMap
+            self.attackMapsValid = True
+        return self.attackMaps[COLOR_INDEX[color]]
+
+    # Function to check whether a location is attacked by any piece of a color
+    def isAttackedBy(self, color, location):
+        return self.getAttackMap(color) & LOCATION_BITS[location] != 0
+
+    # Function to get the locations of all the pieces of a color attacking a location
+    def attackersOf(self, color, location):
+        bit = LOCATION_BITS[location]
+        if not self.getAttackMap(color) & bit:
+            return []
+        return [
+            locationFromSquare(square)
+            for square in bitboardSquares(self.colorBitboards[COLOR_INDEX[color]])
+            if self.attacks[square] & bit
+        ]
+
+    # Function to find the pieces of a color pinned to their king by an opponents slider
+    # Returns the square of each pinned piece, with a bitboard of the squares it can still move to
+    def pinnedPieces(self, color):
+        colorIdx = COLOR_INDEX[color]
+        kingSquare = self.kingSquares[colorIdx]
+        pins = {}
+        if kingSquare is None:
+            return pins
+        for pieceIdx in SLIDER_IDXS:
+            if pieceIdx // 6 == colorIdx:
+                continue
+            for square in bitboardSquares(self.pieceBitboards[pieceIdx]):
+                # The slider must be lined up with the king along one of its own directions
+                if (
+                    DIRECTION_BETWEEN[square][kingSquare]
+                    not in SLIDER_DIRECTIONS[pieceIdx % 6]
+                ):
+                    continue
+                blockers = BETWEEN[square][kingSquare] & self.occupied
+                # The piece is pinned if it's the only piece in between, and is on the king's side
+                if (
+                    blockers
+                    and blockers & (blockers - 1) == 0
+                    and blockers & self.colorBitboards[colorIdx]
+                ):
+                    pins[blockers.bit_length() - 1] = BETWEEN[square][kingSquare] | (
+                        1 << square
+                    )
+        return pins
+
+    # Function to check whether any piece is located at a location
+    def isOccupied(self, location):
+        return self.occupied & LOCATION_BITS.get(location, 0) != 0
+
+    # Function to check whether a piece of the given color is located at a location
+    def isOwnPiece(self, color, location):
+        return (
+            self.colorBitboards[COLOR_INDEX[color]] & LOCATION_BITS.get(location, 0)
+            != 0
+        )
+
+    # Function to check whether a piece of the opposite color is located at a location
+    def isOpponentPiece(self, color, location):
+        return (
+            self.colorBitboards[1 - COLOR_INDEX[color]] & LOCATION_BITS.get(location, 0)
+            != 0
+        )
+
+    # Function to find the index of the piece located at a location (None if empty)
+    def pieceIdxAt(self, location):
+        if location not in LOCATION_BITS:
+            return None
+        return self.squares[squareFromLocation(location)]
+
+    # Function to get the location of a colors king (None if it has been captured)
+    def kingLocation(self, color):
+        kingSquare = self.kingSquares[COLOR_INDEX[color]]
+        if kingSquare is None:
+            return None
+        return locationFromSquare(kingSquare)
@@ -0,0 +1,118 @@
+import torch
+import os
+import threading
+
+
+# Class to save model checkpoints from a background thread, so training never waits on the disk
+# Each save snapshots the weights in memory, and the thread writes the newest snapshot to a
+# versioned file (model-000001.pth, ...) and to the latest file (model.pth)
+# Files are written to a temporary file and renamed, so a crash never leaves a half written checkpoint
+# Only the newest keep versioned checkpoints are kept
+class CheckpointWriter:
+    def __init__(self, folder="./model", fileName="model.pth", keep=5):
+        self.folder = folder
+        self.fileName = fileName
+        self.keep = keep
+        os.makedirs(folder, exist_ok=True)
+        # Continuing the version numbers of any checkpoints already in the folder
+        versions = self.listVersions()
+        self.version = versions[-1] if versions else 0
+
+        # The snapshot waiting to be written, only the newest is kept if the thread falls behind
+        self.pending = None
+        self.writing = False
+        self.closed = False
+        self.error = None
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self.writeLoop, daemon=True)
+        self.thread.start()
+
+    # Function to get the path of a versioned checkpoint
+    def versionPath(self, version):
+        name, extension = os.path.splitext(self.fileName)
+        return os.path.join(self.folder, f"{name}-{version:06d}{extension}")
+
+    # Function to find the versions of the checkpoints in the folder, oldest first
+    def listVersions(self):
+        name, extension = os.path.splitext(self.fileName)
+        versions = []
+        for file in os.listdir(self.folder):
+            if file.startswith(name + "-") and file.endswith(extension):
+                version = file[len(name) + 1 : len(file) - len(extension)]
+                if version.isdigit():
+                    versions.append(int(version))
+        return sorted(versions)
+
+    # Function to queue a checkpoint of a model, returning as soon as its weights are copied
+    # Returns the version number the checkpoint will be written as
+    def save(self, model):
+        self.raiseError()
+        snapshot = {
+            key: value.detach().clone() for key, value in model.state_dict().items()
+        }
+        with self.condition:
+            self.version += 1
+            self.pending = (self.version, snapshot)
+            self.condition.notify_all()
+            return self.version
+
+    # Function run by the background thread, writing each snapshot as it arrives
+    def writeLoop(self):
+        while True:
+            with self.condition:
+                while self.pending is None and not self.closed:
+                    self.condition.wait()
+                if self.pending is None:
+                    return
+                version, snapshot = self.pending
+                self.pending = None
+                self.writing = True
+            try:
+                self.writeCheckpoint(version, snapshot)
+            except Exception as error:
+                self.error = error
+            with self.condition:
+                self.writing = False
+                self.condition.notify_all()
+
+    # Function to write a checkpoint, to a temporary file which is then renamed over the real one
+    def writeCheckpoint(self, version, snapshot):
+        for path in (
+            self.versionPath(version),
+            os.path.join(self.folder, self.fileName),
+        ):
+            self.writeAtomically(path, snapshot)
+        # Removing the oldest versioned checkpoints
+        versions = self.listVersions()
+        for oldVersion in versions[: max(0, len(versions) - self.keep)]:
+            os.remove(self.versionPath(oldVersion))
+
+    # Function to write a file through a temporary file, making sure it's on disk before it's renamed
+    def writeAtomically(self, path, snapshot):
+        tempPath = path + ".tmp"
+        with open(tempPath, "wb") as file:
+            torch.save(snapshot, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tempPath, path)
+
+    # Function to wait until every queued checkpoint has been written
+    def wait(self):
+        with self.condition:
+            while self.pending is not None or self.writing:
+                self.condition.wait()
+        self.raiseError()
+
+    # Function to write any queued checkpoint and stop the background thread
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.thread.join()
+        self.raiseError()
+
+    # Function to raise any error from writing a checkpoint in the caller's thread
+    def raiseError(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
@@ -1,61 +1,316 @@
 from chess_game_environment import ChessGameAI
-from chess_game_model import LinearQNet, QTrainer
-from chess_pieces import Pawn, Knight, Bishop, Rook, Queen, King
+from chess_game_model import LinearQNet, QTrainer, STATE_SIZE, stateTensor
+from chess_inference import InferenceModel
+from chess_checkpoint import CheckpointWriter
+from chess_metrics import PhaseTimers
+from chess_pieces import Pawn, Bishop, Rook, Queen, King
+from chess_bitboard import LOCATION_BITS, squareFromLocation, locationFromSquare
+from chess_tables import BETWEEN
+from chess_state_packing import packBitboards
+from chess_move_encoding import (
+    MOVE_DTYPE,
+    NUM_ACTIONS,
+    FLAG_PROMOTION,
+    FLAG_CASTLING,
+    encodeMove,
+    moveFromSquare,
+    moveToSquare,
+    moveAction,
+)
 import numpy as np
 import torch
 import random
-from collections import deque
+from chess_replay_buffer import (
+    ReplayBuffer,
+    MemoryMappedReplayBuffer,
+    PrioritizedReplayBuffer,
+)
 import pygame
 import sys
 
 # Defining some constant parameters used throughout the agent
 MAX_MEMORY = 2000
+MAX_DISK_MEMORY = 2000000  # Capacity of the memory when it's stored on disk
 BATCH_SIZE = 1000
 LR = 0.001  # Learning Rate
 
+# Bitboard with every square of the board set
+ALL_SQUARES = (1 << 64) - 1
 
-class ChessAgent:
+
+# Class for a player within the game, which finds its legal moves and describes the board as a state
+# It has no model, so it can be used for games where the moves are chosen elsewhere (e.g. the vectorized games)
+class ChessPlayer:
     def __init__(self):
         self.chessPieces = []
-        self.n_games = 0
-        self.epsilon = 0  # Parameter to control the randomness of the agent
-        self.gamma = 0.9  # Discount rate (included as part of the model and trainer)
-        # Defining some memory structure for the agent
-        self.memory = deque(
-            maxlen=MAX_MEMORY
-        )  # If you exceed MAX_MEMORY, it automatically pops items from the deque
-        self.model = LinearQNet(
-            8, 512, 64
-        )  # Needs input size, hidden layer size and output size
-        self.trainer = QTrainer(LR, self.gamma, self.model)
-
-    # Function to load in a model, if needed
-    def loadModel(self, file_path):
-        self.model.load_state_dict(torch.load(file_path))  # Path to your saved model
+        self.board = None  # Bitboard position of the game, assigned by the environment
+        self.color = None  # Color of the player's pieces, assigned by the environment
+        self.pieceAt = None  # The piece on every square, assigned by the environment
+        # Cache of positions seen before, shared by the environment
+        self.moveCache = None
 
     # Function to get the agent's state
     def get_state(self, opponent):
-        # Calculating all the moves of yourself and your opponent
-        opponent_moves = opponent.calculateAllPossibleMoves(
-            False, self, self.chessPieces
-        )
         # Making a tensor for the position of all the pieces on the board
         piece_position_tensor = self.calculatePiecePositionTensor(
             self.chessPieces + opponent.chessPieces
         )
         # Finding out all the squares which your opponent could attack (8x8 array)
-        vulnerable_squares = self.calculateVulnerableSquares(opponent_moves)
+        # These are read from the attack maps the board keeps up to date, rather than regenerating moves
+        # and are cached, so positions seen before don't need converting again
+        # The plane only depends on the position and the attacking color, so it's cached under the
+        # opponent's key (get_state is also called with the player as its own opponent, see playMove)
+        positionKey = self.board.positionKey(opponent.color)
+        vulnerable_squares = (
+            self.moveCache.get(positionKey, "vulnerableSquares")
+            if self.moveCache is not None
+            else None
+        )
+        if vulnerable_squares is None:
+            vulnerable_squares = self.calculateVulnerableSquares(
+                self.board.getAttackMap(opponent.color)
+            )
+            if self.moveCache is not None:
+                self.moveCache.put(positionKey, "vulnerableSquares", vulnerable_squares)
         # Making the array into a tensor, so I can combine it with the other tensor
         vulnerable_squares_plane = np.expand_dims(vulnerable_squares, axis=0)
 
         return np.concatenate([piece_position_tensor, vulnerable_squares_plane], axis=0)
 
-    # Function to get a move from a state
-    def get_move(self, opponent, state):
-        # Defining the list of all acceptable moves that could be made
-        acceptableMoves = self.calculateAllPossibleMoves(
-            True, opponent, opponent.chessPieces
+    # Function to get the agent's state packed into 104 bytes, the same state as get_state gives
+    # The planes are the board's bitboards, so they are packed straight from them without building the arrays
+    def get_packed_state(self, opponent):
+        return packBitboards(
+            self.board.pieceBitboards + [self.board.getAttackMap(opponent.color)]
+        )
+
+    # Function to make the Piece Position Tensor, to describe the position of all the pieces
+    def calculatePiecePositionTensor(self, gamePieces):
+        piece_position_tensor = np.zeros((12, 8, 8), dtype=np.int16)
+        for piece in gamePieces:
+            x, y = piece.location
+            piece_position_tensor[piece.tensor_idx][y - 1][x - 1] = 1
+
+        return piece_position_tensor
+
+    # Function to make an array for all vulnerable squares, from the opponent's attack map
+    # Square index (x - 1) + (y - 1) * 8 is bit number of the map, so the bits reshape to [y - 1][x - 1]
+    def calculateVulnerableSquares(self, attackMap):
+        attackBytes = np.frombuffer(attackMap.to_bytes(8, "little"), dtype=np.uint8)
+        vulnerableSquares = np.unpackbits(attackBytes, bitorder="little")
+        return vulnerableSquares.reshape(8, 8).astype(np.int16)
+
+    # Function to find ALL the possible moves the player could make, as [piece, (x,y)] lists
+    def calculateAllPossibleMoves(self, checkmateCheck, opponent, opponentPieces=None):
+        # The legal moves of positions seen before are read from the cache, as encoded moves
+        useCache = checkmateCheck and self.moveCache is not None
+        if useCache:
+            positionKey = self.board.positionKey(self.color)
+            cachedMoves = self.moveCache.get(positionKey, "moves")
+            if cachedMoves is not None:
+                return [
+                    [
+                        self.pieceAt[moveFromSquare(move)],
+                        locationFromSquare(moveToSquare(move)),
+                    ]
+                    for move in cachedMoves.tolist()
+                ]
+
+        allPossibleMoves = self.generateMoves(checkmateCheck, opponent, opponentPieces)
+
+        # Storing the moves encoded, as the piece objects change between games
+        if useCache:
+            self.moveCache.put(positionKey, "moves", self.encodeMoves(allPossibleMoves))
+
+        return allPossibleMoves
+
+    # Function to find the legal moves of the player as an array of encoded moves (see chess_move_encoding)
+    def calculateMoveCodes(self, opponent):
+        if self.moveCache is not None:
+            positionKey = self.board.positionKey(self.color)
+            cachedMoves = self.moveCache.get(positionKey, "moves")
+            if cachedMoves is not None:
+                return cachedMoves
+
+        moves = self.encodeMoves(
+            self.generateMoves(True, opponent, opponent.chessPieces)
         )
+        if self.moveCache is not None:
+            self.moveCache.put(positionKey, "moves", moves)
+        return moves
+
+    # Function to get a mask of the legal actions (4096, True if legal), from the legal encoded moves
+    def calculateActionMask(self, moveCodes):
+        mask = np.zeros(NUM_ACTIONS, dtype=bool)
+        mask[moveAction(moveCodes)] = True
+        return mask
+
+    # Function to encode [piece, (x,y)] moves into an array of 16 bit moves
+    # Pawns reaching the final rank are always promoted to a Queen, and kings moving 2 squares castle
+    def encodeMoves(self, moves):
+        moveCodes = np.zeros(len(moves), dtype=MOVE_DTYPE)
+        for idx, (piece, newLocation) in enumerate(moves):
+            promotion = None
+            flags = 0
+            if isinstance(piece, Pawn) and newLocation[1] == (
+                1 if piece.color == "white" else 8
+            ):
+                promotion = "Queen"
+                flags = FLAG_PROMOTION
+            elif (
+                isinstance(piece, King) and abs(newLocation[0] - piece.location[0]) == 2
+            ):
+                flags = FLAG_CASTLING
+            moveCodes[idx] = encodeMove(
+                squareFromLocation(piece.location),
+                squareFromLocation(newLocation),
+                promotion,
+                flags,
+            )
+        return moveCodes
+
+    # Function to generate the possible moves the player could make, without the cache
+    # If checkmateCheck, only the legal moves are kept
+    def generateMoves(self, checkmateCheck, opponent, opponentPieces=None):
+        allPossibleMoves = []
+
+        # Looping through every user piece and identifying their moves
+        for piece in self.chessPieces:
+            allPossibleMoves += self.identifyPossibleMoves(
+                piece, self.chessPieces, opponentPieces
+            )
+
+        # Looking up the location of the king, tracked by the board
+        kingLocation = self.board.kingLocation(self.color)
+
+        # If checkmateCheck, then only the legal moves are kept
+        # The checks and pins are found once for the position, rather than simulating every move
+        # The check is skipped if the king has been captured, as the game is already over
+        if checkmateCheck and kingLocation is not None:
+            allPossibleMoves = self.filterLegalMoves(
+                allPossibleMoves, opponent, kingLocation
+            )
+
+        return allPossibleMoves
+
+    # Function to remove the moves which would leave the king under attack
+    def filterLegalMoves(self, allPossibleMoves, opponent, kingLocation):
+        kingSquare = squareFromLocation(kingLocation)
+        kingAttacks = self.identifyAttacksOnLocation(opponent, kingLocation)
+
+        # Reading the squares the opponent attacks with the king lifted off the board
+        # so the king can't step backwards along the line of a sliding attack
+        kingIdx = self.board.pieceIdxAt(kingLocation)
+        self.board.removePiece(kingIdx, kingLocation)
+        kingDangerMap = self.board.getAttackMap(opponent.color)
+        self.board.addPiece(kingIdx, kingLocation)
+
+        # Squares the other pieces must move to, to deal with any check on the king
+        if len(kingAttacks) == 0:
+            checkMask = ALL_SQUARES
+        elif len(kingAttacks) == 1:
+            # Either capturing the attacker, or blocking its path to the king
+            attackerSquare = squareFromLocation(kingAttacks[0])
+            checkMask = BETWEEN[attackerSquare][kingSquare] | (1 << attackerSquare)
+        else:
+            checkMask = 0  # Only the king can move out of a double check
+
+        # Pinned pieces can only move along the line between the pinning piece and the king
+        pins = self.board.pinnedPieces(self.color)
+
+        legalMoves = []
+        for action in allPossibleMoves:
+            targetBit = LOCATION_BITS[action[1]]
+            if type(action[0]) == King:
+                # The attack maps include defended pieces, so the king can't capture them either
+                if not kingDangerMap & targetBit:
+                    legalMoves.append(action)
+                continue
+            if not checkMask & targetBit:
+                continue
+            pinMask = pins.get(squareFromLocation(action[0].location))
+            if pinMask is not None and not pinMask & targetBit:
+                continue
+            legalMoves.append(action)
+
+        return legalMoves
+
+    # Function to identify the possible moves a piece can make
+    def identifyPossibleMoves(self, piece, playerPieces, opponentPieces):
+        # Getting the squares the piece can move to, from the precomputed tables
+        moveSquares = piece.getMoveSquares(self.board) + piece.getSpecialMoves(
+            self.board, playerPieces, opponentPieces
+        )
+        return [[piece, locationFromSquare(square)] for square in moveSquares]
+
+    # Function to identify all the pieces that attack a specified location (usually used for the king)
+    def identifyAttacksOnLocation(self, opponent, location):
+        # Reading the attackers from the board's attack maps, rather than regenerating the opponents moves
+        return self.board.attackersOf(opponent.color, location)
+
+
+# Class for the agent, a player which learns to choose its moves with a model
+# If memoryDir is given, the agent's memory is stored on disk within it (and reloaded from it)
+# If prioritized, the memory is sampled by priority (prioritized replay), kept in RAM
+class ChessAgent(ChessPlayer):
+    def __init__(self, memoryDir=None, prioritized=False):
+        super().__init__()
+        self.n_games = 0
+        self.epsilon = 0  # Parameter to control the randomness of the agent
+        self.gamma = 0.9  # Discount rate (included as part of the model and trainer)
+        # Defining some memory structure for the agent
+        # If you exceed MAX_MEMORY, the oldest transitions are overwritten
+        self.prioritized = prioritized
+        if prioritized:
+            if memoryDir is not None:
+                raise ValueError("Prioritized memory can't be stored on disk")
+            self.memory = PrioritizedReplayBuffer(MAX_MEMORY)
+        elif memoryDir is None:
+            self.memory = ReplayBuffer(MAX_MEMORY)
+        else:
+            self.memory = MemoryMappedReplayBuffer(memoryDir, MAX_DISK_MEMORY)
+        # The model takes the whole state, and gives a Q value for every (from, to) action
+        self.model = LinearQNet(
+            STATE_SIZE, 512, NUM_ACTIONS
+        )  # Needs input size, hidden layer size and output size
+        self.trainer = QTrainer(LR, self.gamma, self.model)
+        # Compiled copy of the model used to choose moves, if the agent only plays (see useInferenceModel)
+        self.inferenceModel = None
+        # Timers of the move generation and inference, which can be replaced to share them
+        self.timers = PhaseTimers()
+
+    # Function to load in a model, if needed
+    def loadModel(self, file_path):
+        self.loadWeights(torch.load(file_path))  # Path to your saved model
+
+    # Function to copy weights (a state_dict) into the model, e.g. sent from another process
+    # The tensors are copied into the model's own parameters, so nothing is written to disk
+    def loadWeights(self, stateDict):
+        self.model.load_state_dict(stateDict)
+        if self.inferenceModel is not None:
+            self.inferenceModel.update(self.model)
+
+    # Function to copy another agent's weights into this agent's model
+    def copyWeightsFrom(self, agent):
+        self.loadWeights(agent.model.state_dict())
+
+    # Function to choose moves with a compiled (and optionally int8 quantized) copy of the model
+    # Only for agents which aren't trained, as the copy doesn't change when the model is trained
+    def useInferenceModel(self, quantize=False):
+        self.inferenceModel = InferenceModel(self.model, quantize)
+
+    # Function to get the Q value of every action for a state or a batch of states, without autograd
+    def predict(self, states):
+        if self.inferenceModel is not None:
+            return self.inferenceModel(states)
+        with torch.inference_mode():
+            return self.model(stateTensor(states))
+
+    # Function to get a move from a state, as an encoded move
+    def get_move(self, opponent, state):
+        # Defining the array of all acceptable moves that could be made
+        with self.timers.time("move_generation"):
+            acceptableMoves = self.calculateMoveCodes(opponent)
 
         # Make actions with a balance between randomness and exploitation
         self.epsilon = 400 - self.n_games  # Lower randomness as more games
@@ -63,31 +318,40 @@ class ChessAgent:
         if random.randint(0, 400) < self.epsilon:
             # Choosing a random move and setting it to 1
             moveIdx = random.randint(0, len(acceptableMoves) - 1)
-            finalMove = acceptableMoves[moveIdx]
+            finalMove = int(acceptableMoves[moveIdx])
         else:
 
-            state0 = torch.tensor(
-                state, dtype=torch.float
-            )  # Converting state into a tensor
-            prediction = self.model(state0)[0][
-                0
-            ]  # Making a prediction, outputs a 13-8-64 tensor so take the first one
+            with self.timers.time("inference"):
+                prediction = self.predict(state)  # Making a prediction, one per action
 
-            finalMove = None
-            while finalMove is None:
-                moveIdx = torch.argmax(
-                    prediction
-                ).item()  # .item() is used to convert outputted tensor into a number
+            # Only the actions of the acceptable moves are considered, so one argmax picks the move
+            legalPredictions = prediction[moveAction(acceptableMoves.astype(np.int64))]
+            moveIdx = torch.argmax(
+                legalPredictions
+            ).item()  # .item() is used to convert outputted tensor into a number
+            finalMove = int(acceptableMoves[moveIdx])
 
-                board_coordinate = self.getCoordinate(moveIdx)
+        return finalMove
 
-                for move in acceptableMoves:
-                    if move[1] == board_coordinate:
-                        finalMove = move
+    # Function to choose moves for a batch of games at once (e.g. from VectorChessGame)
+    # Returns the action (the squares to move from and to) for each game, only ever choosing a legal action
+    # The model is run once over all the states, rather than once per game
+    def get_moves(self, states, masks):
+        # Make actions with a balance between randomness and exploitation
+        self.epsilon = 400 - self.n_games  # Lower randomness as more games
 
-                prediction[moveIdx] = -1
+        with self.timers.time("inference"):
+            predictions = self.predict(states)
+        # Illegal actions can never be the highest prediction
+        predictions = predictions.masked_fill(~torch.from_numpy(masks), float("-inf"))
+        actions = torch.argmax(predictions, dim=1).numpy()
 
-        return finalMove
+        # Deciding whether to choose a random move or not, for each game
+        for idx in range(len(actions)):
+            if random.randint(0, 400) < self.epsilon:
+                actions[idx] = random.choice(np.flatnonzero(masks[idx]))
+
+        return actions
 
     # Function to append informations to the agent's memory
     def remember(self, old_state, final_move, reward, new_state, checkmate):
@@ -101,236 +365,97 @@ class ChessAgent:
 
     # Function to train the agent's long memory
     def train_long_memory(self):
-        # If we have enough items in memory, get a random batch from memory
-        if len(self.memory) > BATCH_SIZE:
-            mini_sample = random.sample(self.memory, BATCH_SIZE)
-        else:
-            mini_sample = self.memory
-
-        # Extracting the separate states, action, etc from each of the tuples extracted
-        # As each tuple has a state, action, etc. This code just goes through each tuple and extracts the value
-        # It combines them into separate arrays for each of the values
-        states, actions, rewards, next_states, dones = zip(*mini_sample)
-        # Passing these extracted states into the train_step function
-        self.trainer.train_step(states, actions, rewards, next_states, dones)
-
-    # Function to make the Piece Position Tensor, to describe the position of all the pieces
-    def calculatePiecePositionTensor(self, gamePieces):
-        piece_position_tensor = np.zeros((12, 8, 8), dtype=np.int16)
-        for piece in gamePieces:
-            x, y = piece.location
-            piece_position_tensor[piece.tensor_idx][y - 1][x - 1] = 1
-
-        return piece_position_tensor
-
-    # Function to make an array for all vulnerable squares
-    def calculateVulnerableSquares(self, opponentMoves):
-        vulnerableSquares = np.zeros((8, 8), dtype=np.int16)
-        for move in opponentMoves:
-            x, y = move[1]
-            vulnerableSquares[y - 1][x - 1] = 1
-        return vulnerableSquares
-
-    # Function to turn a position within the prediction to a coordinate
-    def getCoordinate(self, idx):
-        x = idx % 8 + 1
-        y = idx // 8 + 1
-        return x, y
-
-    # Function to find ALL the possible moves the player could make
-    def calculateAllPossibleMoves(self, checkmateCheck, opponent, opponentPieces=None):
-        allPossibleMoves = []
-        kingLocation = ()  # Location of the king
-        king = None  # Will store the users king, when found
-
-        # Looping through every user piece and identifying their moves
-        for piece in self.chessPieces:
-            allPossibleMoves += self.identifyPossibleMoves(
-                piece, self.chessPieces, opponentPieces
-            )
-            # This is used within checkmate check, if required
-            if type(piece) == King:
-                kingLocation = piece.location
-                king = piece
-
-        # If checkmateCheck, then we need to apply the checking for checkmate
-        if checkmateCheck:
-            kingAttacks = self.identifyAttacksOnLocation(opponent, kingLocation)
-
-            # Iterating over a copy of allPossibleMoves, so we can remove actions without affecting the for loop
-            for action in allPossibleMoves[:]:
-                if len(allPossibleMoves) == 0:
-                    break
-                # For every action that involves the king
-                if action[0] == king:
-                    # If the king's move still leads to the king attacked, pop it from the list
-                    if len(self.identifyAttacksOnLocation(opponent, action[1])) != 0:
-                        allPossibleMoves.remove(action)
-                    # Checking whether any of the opponents pieces has the action as a blocker
-                    elif self.checkOpponentBlockers(opponentPieces, action[1]):
-                        allPossibleMoves.remove(action)
-                # Only applying the blocker checks if there is only one piece attacking the king
-                elif len(kingAttacks) == 1:
-                    if not self.blockedMove(kingLocation, kingAttacks[0], action[1]):
-                        allPossibleMoves.remove(action)
-                # Checking whether making the action will discover an attack on the king
-                else:
-                    # Simulating moving the piece
-                    original_location = action[0].location
-                    action[0].location = action[1]
-                    # Calculating all the moves that could be made if the piece was moved
-                    opponent_possible_moves = self.calculateAllPossibleMoves(
-                        False, self, self.chessPieces
-                    )
-                    # If any of the moves is a direct attack on the king, don't allow the original move to be made
-                    for move in opponent_possible_moves:
-                        if move[1] == kingLocation:
-                            allPossibleMoves.remove(action)
-                            break
-                    # Return piece back to its original location
-                    action[0].location = original_location
-
-        return allPossibleMoves
+        if len(self.memory) == 0:
+            return
+        # Sampling by priority, and updating the priorities from the TD errors of the training
+        if self.prioritized:
+            batch, indices, weights = self.memory.samplePrioritized(BATCH_SIZE)
+            tdErrors = self.trainer.train_batch(*batch, weights=weights)
+            self.memory.updatePriorities(indices, tdErrors)
+            return
+        # Getting a random batch from memory (or all of it, if there isn't enough), as one array per value
+        states, actions, rewards, next_states, dones = self.memory.sample(BATCH_SIZE)
+        # Passing these arrays straight into the trainer
+        self.trainer.train_batch(states, actions, rewards, next_states, dones)
+
+
+# Function to play one move of a game between two agents, timing each phase
+# If training, the player who moved trains its short memory and both players remember the move
+# Returns the player who moved and whether the game has finished
+def playMove(game, player1, player2, timers, training=True):
+    currentPlayer = game.playerTurn
+    opponent = player2 if game.playerTurn == player1 else player1
+    with timers.time("get_state"):
+        old_state = game.playerTurn.get_state(opponent)
+    final_move = game.playerTurn.get_move(opponent, old_state)
+    # play_step times its own parts (apply_move, checkmate_check and render)
+    reward, checkmate, score = game.play_step(final_move)
+    timers.count("moves")
+    if not training:
+        return currentPlayer, checkmate
+    with timers.time("get_state"):
+        new_state = game.playerTurn.get_state(opponent)
 
-    # Function to identify the possible moves a piece can make
-    def identifyPossibleMoves(self, piece, playerPieces, opponentPieces):
-        possibleMoves = []
-        allPieceActions = piece.actions + piece.getSpecialMoves(
-            playerPieces, opponentPieces
-        )
-        for action in allPieceActions:
-            if piece.color == "white":
-                # Multiplying the action by -1 as we are moving in the opposite direction, up the board
-                action = (action[0] * -1, action[1] * -1)
-            new_pos = (piece.location[0] + action[0], piece.location[1] + action[1])
-            # Ensuring the (x,y) values are between 1 and 8
-            if 1 <= new_pos[0] <= 8 and 1 <= new_pos[1] <= 8:
-                # Ensuring that none of the player's pieces are located at the new moves location
-                if all(pPiece.location != new_pos for pPiece in playerPieces):
-                    # Implement the code to check for blockers here, and reject if necessary
-                    # Not implementing checks for Knights, as they can't be blocked
-                    if type(piece) != Knight:
-                        # Calculating the blocker locations for the current piece
-                        piece.checkBlockerLocations(playerPieces + opponentPieces)
-                        # Calculating the direction of the current action
-                        tempAction = action
-                        # Reverting back the action, so we can determine the correct way the piece is moving
-                        if piece.color == "white":
-                            tempAction = (tempAction[0] * -1, tempAction[1] * -1)
-                        direction = piece.getDirectionFromAction(tempAction)
-                        # Determining whether the move is blocked or not
-                        blocked = piece.checkBlockedMove(new_pos, direction)
-                        # If the move is blocked, move to the next action
-                        if blocked:
-                            continue
-                    # If no blockers, add the move to possible moves
-                    possibleMoves.append([piece, new_pos])
-        return possibleMoves
-
-    # Function to identify all the moves that attack a specified location (usually used for the king)
-    def identifyAttacksOnLocation(self, opponent, location):
-        # Getting a list of all the opponents actions
-        actionsToCheck = opponent.calculateAllPossibleMoves(
-            False, self, self.chessPieces
+    # Training the short memory
+    with timers.time("train_short_memory"):
+        currentPlayer.train_short_memory(
+            old_state, final_move, reward, new_state, checkmate
         )
 
-        attackingPieces = []  # Defining list of all pieces directly attacking the king
-        for action in actionsToCheck:
-            # If the actions location matches the king's location, it means that that piece can attack the king
-            if action[1] == location:
-                attackingPieces.append(action[0].location)
-
-        return attackingPieces  # Returning all pieces that can attack the king
-
-    # Function which checks whether an opponents piece has a location as a blocker, as whether it would be able to attack that location or not
-    def checkOpponentBlockers(self, opponentPieces, location):
-        # Going through all the opponents pieces
-        for piece in opponentPieces:
-            # Checking if a blocker exists at the location we are checking for
-            blockerExists = piece.checkForBlocker(location)
-            if blockerExists:
-                # Checking whether any of the piece's moves could reach the location, if the blocker didn't exist
-                for move in piece.actions:
-                    new_pos = (piece.location[0] + move[0], piece.location[1] + move[1])
-                    if new_pos == location:
-                        # If it could, return True
-                        return True
-        return False
-
-    def blockedMove(self, location, attackerLocation, blockerLocation):
-        ax, ay = attackerLocation
-        kx, ky = location
-        bx, by = blockerLocation
-
-        dx, dy = kx - ax, ky - ay
-
-        # Normalize direction to unit step
-        def sign(n):
-            return (n > 0) - (n < 0)
-
-        step_x = sign(dx)
-        step_y = sign(dy)
-
-        if blockerLocation == attackerLocation:
-            return True  # Same square
-
-        # Build path from attacker to target
-        cx, cy = ax + step_x, ay + step_y
-        while (cx, cy) != (kx, ky):
-            # If the blocker location is identified within the path, attack blocked
-            if (cx, cy) == (bx, by):
-                return True
-            cx += step_x
-            cy += step_y
-
-        return False
+    # Remember this information
+    with timers.time("remember"):
+        currentPlayer.remember(old_state, final_move, reward, new_state, checkmate)
+        opponent.remember(old_state, final_move, -reward, new_state, checkmate)
+
+    return currentPlayer, checkmate
 
 
 # Function to train the chess agents
-def train():
+# If headless, the game isn't displayed, which makes training faster
+# The time spent in each phase is written to metricsPath every metricsInterval seconds (see PhaseTimers)
+def train(headless=False, metricsPath="./metrics.jsonl", metricsInterval=60.0):
     # Making the Agents and the Environment
     player1 = ChessAgent()
     player2 = ChessAgent()
-    game = ChessGameAI(player1, player2)
+    game = ChessGameAI(player1, player2, headless=headless)
+    # The players and the game share one set of timers
+    timers = PhaseTimers(metricsPath, metricsInterval)
+    player1.timers = player2.timers = game.timers = timers
+    # Checkpoints are written from a background thread, so the games don't wait on the disk
+    checkpointWriter = CheckpointWriter()
     winners = []
     count = 0
 
     while True:
 
-        currentPlayer = game.playerTurn
-        opponent = player2 if game.playerTurn == player1 else player1
-        old_state = game.playerTurn.get_state(opponent)
-        final_move = game.playerTurn.get_move(opponent, old_state)
-        reward, checkmate, score = game.play_step(final_move)
-        new_state = game.playerTurn.get_state(opponent)
-
-        # Training the short memory
-        currentPlayer.train_short_memory(
-            old_state, final_move, reward, new_state, checkmate
-        )
-
-        # Remember this information
-        currentPlayer.remember(old_state, final_move, reward, new_state, checkmate)
-        opponent.remember(old_state, final_move, -reward, new_state, checkmate)
+        currentPlayer, checkmate = playMove(game, player1, player2, timers)
+        opponent = player2 if currentPlayer == player1 else player1
 
         # If the agent has checkmated the opponent
         if checkmate:
             player = "Player 1" if currentPlayer == player1 else "Player 2"
             print(player + " won the game")
-            currentPlayer.train_long_memory()
-            opponent.train_long_memory()
+            with timers.time("train_long_memory"):
+                currentPlayer.train_long_memory()
+                opponent.train_long_memory()
+            timers.count("games")
             game.reset()
             player1.n_games += 1
             player2.n_games += 1
-            # Saving the winning players model
-            currentPlayer.model.save("model.pth")
+            # Saving the winning players model, and both players memory
+            checkpointWriter.save(currentPlayer.model)
+            currentPlayer.memory.flush()
+            opponent.memory.flush()
             # Appending the current player to the list of winners
             winners.append(currentPlayer)
             # If the currentPlayer has won the last 3 games, update the opponents model
             latest_winners = winners[len(winners) - 3 :]
             if all(currentPlayer == player for player in latest_winners):
                 print("Updating opponents model")
-                opponent.loadModel("./model/model.pth")
+                # Copying the weights straight from the winner, rather than loading its checkpoint
+                opponent.copyWeightsFrom(currentPlayer)
+
+        timers.maybeWrite()
 
 
 if __name__ == "__main__":
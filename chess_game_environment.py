@@ -1,11 +1,20 @@
 import pygame
 from chess_pieces import Pawn, Knight, Bishop, Rook, Queen, King
+from chess_bitboard import (
+    BitboardPosition,
+    CASTLING_MASKS,
+    squareFromLocation,
+    locationFromSquare,
+)
+from chess_move_encoding import moveFromSquare, moveToSquare, movePromotion
 from chess_game_popup import show_popup
+from chess_move_cache import PositionCache
+from chess_metrics import PhaseTimers
+from collections import namedtuple
 import sys
 
-# Initialising the PyGame environment
-pygame.init()
-clock = pygame.time.Clock()
+# The PyGame clock, created when it's first needed so importing this module has no side effects
+clock = None
 
 # Defining the different colours used throughout the game
 LIGHT = (240, 217, 181)
@@ -13,6 +22,25 @@ DARK = (105, 170, 75)
 HIGHLIGHT = (255, 76, 78)
 CURRENTHIGHIGHLIGHT = (205, 76, 78)
 
+# Record of everything a move changed, so that it can be unmade
+# movedBefore is None for pieces which don't track whether they've moved
+# rook is the castling rook (if castling) and promotedPiece is the piece a pawn was promoted into
+MoveRecord = namedtuple(
+    "MoveRecord",
+    [
+        "piece",
+        "oldLocation",
+        "movedBefore",
+        "castlingRights",
+        "capturedPiece",
+        "capturedIdx",
+        "rook",
+        "rookOldLocation",
+        "promotedPiece",
+        "pawnIdx",
+    ],
+)
+
 
 # Defining the Chess Game Environment
 class ChessGameAI:
@@ -22,17 +50,33 @@ class ChessGameAI:
         player1,
         player2,
         windowSize=640,
+        headless=False,
+        moveCache=None,
     ):
         # Defining the height and width of the game window
         self.windowSize = windowSize
-        # Setting the height of the outputted display
-        self.display = pygame.display.set_mode((self.windowSize, self.windowSize))
-        pygame.display.set_caption("Chess Game")
+        # When headless, there is no display and the pieces don't load their images
+        self.headless = headless
+        if headless:
+            self.display = None
+        else:
+            # Initialising the PyGame environment, only once a window is actually needed
+            pygame.init()
+            # Setting the height of the outputted display
+            self.display = pygame.display.set_mode((self.windowSize, self.windowSize))
+            pygame.display.set_caption("Chess Game")
         # Calculating the heights and widths of the board spaces
         self.blockSize = windowSize // 8
+        # The size the piece images are scaled to (None, so no images are loaded, if headless)
+        self.imageSize = None if headless else self.blockSize
         # Initialising the players within the game
         self.player1 = player1
         self.player2 = player2
+        # Cache of the legal moves and attack planes of positions seen before, kept between games
+        # A cache can be passed in, to share it between several games
+        self.moveCache = moveCache if moveCache is not None else PositionCache()
+        # Timers of the phases of each step, which can be replaced to share them with the players
+        self.timers = PhaseTimers()
         # Initialising the state of the game
         self.reset()
 
@@ -53,6 +97,24 @@ class ChessGameAI:
         self.generateChessPieces(self.player2, 2)
         # Initialising whose turn it is to play
         self.playerTurn = self.player1
+        self.setupPosition()
+
+    # Function to build the board, square lookup and undo stack from the players' pieces
+    def setupPosition(self):
+        # Creating the bitboard position of the pieces, shared with both players
+        self.board = BitboardPosition.fromPieces(
+            self.player1.chessPieces + self.player2.chessPieces
+        )
+        # Indexing every piece by the square it's on, so pieces can be looked up without scanning
+        self.pieceAt = [None] * 64
+        for chessPiece in self.player1.chessPieces + self.player2.chessPieces:
+            self.pieceAt[squareFromLocation(chessPiece.location)] = chessPiece
+        for player in (self.player1, self.player2):
+            player.board = self.board
+            player.pieceAt = self.pieceAt
+            player.moveCache = self.moveCache
+        # Stack of the records of every move made, so they can be unmade
+        self.undoStack = []
         # Keeping track of the moveNmb within the game
         self.moveNmb = 1
         # Displaying the initial chess board
@@ -69,24 +131,83 @@ class ChessGameAI:
             baseRow = 1
             pawnRow = 2
             color = "black"
+        player.color = color
 
         # Defining the order of Pieces in the base row
         piece_classes = [Rook, Knight, Bishop, Queen, King, Bishop, Knight, Rook]
         # Creating all of the Pieces, at the correct locations
         chessPieces = [
-            pieceClass(x + 1, baseRow, color, self.chessPieceId + x, self.blockSize)
+            pieceClass(x + 1, baseRow, color, self.chessPieceId + x, self.imageSize)
             for x, pieceClass in enumerate(piece_classes)
         ]
         self.chessPieceId += 7
         # Adding a Pawn Piece in every square of the Pawn Row
         chessPieces.extend(
-            Pawn(i, pawnRow, color, self.chessPieceId + i, self.blockSize)
+            Pawn(i, pawnRow, color, self.chessPieceId + i, self.imageSize)
             for i in range(1, 9)
         )
         self.chessPieceId += 8
 
         player.chessPieces = chessPieces
 
+    # Function to set up the game from a position in FEN notation (e.g. for perft)
+    # FEN lists the ranks from black's back rank (y = 1) down to white's back rank (y = 8)
+    def loadFen(self, fen):
+        fields = fen.split()
+        piece_classes = {
+            "p": Pawn,
+            "n": Knight,
+            "b": Bishop,
+            "r": Rook,
+            "q": Queen,
+            "k": King,
+        }
+        self.currentPiece = None
+        self.chessPieceId = 1
+        self.player1.color = "white"
+        self.player2.color = "black"
+        self.player1.chessPieces = []
+        self.player2.chessPieces = []
+
+        # Creating the pieces of each rank, digits are runs of empty squares
+        for y, rank in enumerate(fields[0].split("/"), start=1):
+            x = 1
+            for char in rank:
+                if char.isdigit():
+                    x += int(char)
+                    continue
+                player = self.player1 if char.isupper() else self.player2
+                piece = piece_classes[char.lower()](
+                    x, y, player.color, self.chessPieceId, self.imageSize
+                )
+                self.chessPieceId += 1
+                player.chessPieces.append(piece)
+                x += 1
+
+        # Setting the moved flags, which decide pawn double moves and castling
+        castling = fields[2] if len(fields) > 2 else "-"
+        castlingRooks = {
+            "K": (8, 8),
+            "Q": (1, 8),
+            "k": (8, 1),
+            "q": (1, 1),
+        }
+        unmovedLocations = {castlingRooks[char] for char in castling if char != "-"}
+        for piece in self.player1.chessPieces + self.player2.chessPieces:
+            if isinstance(piece, Pawn):
+                piece.moved = piece.location[1] != (7 if piece.color == "white" else 2)
+            elif isinstance(piece, Rook):
+                piece.moved = piece.location not in unmovedLocations
+            elif isinstance(piece, King):
+                homeRank = 8 if piece.color == "white" else 1
+                piece.moved = not any(
+                    location[1] == homeRank for location in unmovedLocations
+                )
+
+        # Initialising whose turn it is to play
+        self.playerTurn = self.player2 if fields[1] == "b" else self.player1
+        self.setupPosition()
+
     # Code to display the initial board to the screen
     def displayInitialBoard(self):
         # The code to display the board background (the squares) is below
@@ -114,45 +235,44 @@ class ChessGameAI:
         pygame.display.update()  # Updating the screen to display the squares
 
     # Function to process an action on the board, and call the function to perform the move
+    # The action is an encoded move (see chess_move_encoding), or [piece, (x,y)]
     def play_step(self, action):
         # Processing pygame events, if any
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                sys.exit()
-
+        if not self.headless:
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    sys.exit()
+
+        promotion = None
+        if not isinstance(action, list):
+            promotion = movePromotion(action)
+            action = self.decodeMove(action)
         oldLocation = action[0].location
 
         # Storing who the currently player was
         currentPlayer = self.playerTurn
-        # Getting the player's pieces
-        playerPieces = currentPlayer.chessPieces
-        # Getting the opponents pieces
-        opponentPieces = (
-            self.player2.chessPieces
-            if self.playerTurn == self.player1
-            else self.player1.chessPieces
-        )
 
-        # Setting the chosen piece to be the current piece
-        self.currentPiece = action[0]
-        reward = self._move(action[1], opponentPieces)  # Performing the move
-
-        player_score = self.calculateScore(
-            currentPlayer
-        )  # Calculating the player's score
-        opposition_score = self.calculateScore(
-            self.playerTurn
-        )  # Calculating the oppositions score
-        score = self.plus_prefix(player_score - opposition_score)
-
-        # Calculating all the moves the opponent can now make
-        opposition_moves = self.playerTurn.calculateAllPossibleMoves(
-            True, currentPlayer, playerPieces
-        )
+        # The step is timed in parts which don't overlap, so their times add up to the whole step
+        with self.timers.time("apply_move"):
+            # Setting the chosen piece to be the current piece
+            self.currentPiece = action[0]
+            reward = self._move(action[1], promotion)  # Performing the move
+
+            player_score = self.calculateScore(
+                currentPlayer
+            )  # Calculating the player's score
+            opposition_score = self.calculateScore(
+                self.playerTurn
+            )  # Calculating the oppositions score
+            score = self.plus_prefix(player_score - opposition_score)
+
+        # Calculating all the moves the opponent can now make (cached, so get_move reuses them)
+        with self.timers.time("checkmate_check"):
+            opposition_moves = self.playerTurn.calculateMoveCodes(currentPlayer)
 
         checkmate = (
             True
-            if opposition_moves == []
+            if len(opposition_moves) == 0
             or opposition_score < 800
             or opposition_score == player_score
             and player_score == 1000
@@ -160,13 +280,18 @@ class ChessGameAI:
         )
 
         # Code to update the UI once the action has been made
-        self._update_ui(False, oldLocation, action)
+        with self.timers.time("render"):
+            self._update_ui(False, oldLocation, action)
 
         # Returning the reward from the move, the player's current score and whether checkmate or not
         return reward, checkmate, score
 
     # Function to update the outputted UI display
     def _update_ui(self, resetGrid, old_location=None, action=None):
+        # There is nothing to draw when headless
+        if self.headless:
+            return
+
         # Resetting the display of the board
         if resetGrid:
             self.display.fill((255, 255, 255))
@@ -218,67 +343,19 @@ class ChessGameAI:
         pygame.display.update()
 
     # Function to perform a move on the board
-    def _move(self, action, opponentPieces):
+    def _move(self, action, promotion=None):
         # Initialising reward to be returned later
         reward = 0
-        # Defining how much movement happened
-        movement = (
-            action[0] - self.currentPiece.location[0],
-            action[1] - self.currentPiece.location[1],
-        )
-        self.currentPiece.location = action  # Moving the piece to the location'
-
-        # If the current piece tracks self.moved and hasn't been moved yet, update it
-        if (
-            isinstance(self.currentPiece, (Pawn, Rook, King))
-            and not self.currentPiece.moved
-        ):
-            self.currentPiece.moved = True
-
-        # If the pawn reaches the final rank, allow the piece for promotion
-        if isinstance(self.currentPiece, Pawn):
-            final_rank = (
-                1 if self.currentPiece.color == "white" else 8
-            )  # Finding that pieces final rank
-            if self.currentPiece.location[1] == final_rank:
-                # Making sure they select a valid option, by continuously showing the popup
-                choice = "Queen"
-                self.promote_pawn(choice)  # Promoting the pawn
-
-        # If the king makes a castling move, move the rook aswell to the correct place
-        if isinstance(self.currentPiece, King):
-            if movement == (-2, 0):
-                # Queenside castling
-                rook = [
-                    piece
-                    for piece in self.playerTurn.chessPieces
-                    if isinstance(piece, Rook)
-                    and piece.location[0] == self.currentPiece.location[0] - 2
-                ][0]
-                rook.location = (
-                    self.currentPiece.location[0] + 1,
-                    self.currentPiece.location[1],
-                )
-            elif movement == (2, 0):
-                # Kingside castling
-                rook = [
-                    piece
-                    for piece in self.playerTurn.chessPieces
-                    if isinstance(piece, Rook)
-                    and piece.location[0] == self.currentPiece.location[0] + 1
-                ][0]
-                rook.location = (
-                    self.currentPiece.location[0] - 1,
-                    self.currentPiece.location[1],
-                )
-
-        # Checking whether the move has captured any pieces
-        for chessPiece in opponentPieces:
-            # If action == chessPiece.location, the piece should be captured
-            if action == chessPiece.location:
-                # Capturing the piece (taking it off the board)
-                opponentPieces.remove(chessPiece)
-                # Outputting the scroe as a result of the capture
+        # Making the move, which also changes whose turn it is
+        # Making sure they select a valid option, the pawn is promoted to a Queen unless the move says otherwise
+        capturedPiece = self.make_move(
+            [self.currentPiece, action], promotion or "Queen"
+        ).capturedPiece
+
+        # If a piece was captured, output the scores and reward the capture
+        if capturedPiece is not None:
+            # Outputting the scroe as a result of the capture (only when the game is displayed)
+            if not self.headless:
                 player1Score = self.calculateScore(self.player1)
                 player2Score = self.calculateScore(self.player2)
                 player1Diff = self.plus_prefix(player1Score - player2Score)
@@ -290,7 +367,7 @@ class ChessGameAI:
                     + ", Player 2 : "
                     + str(player2Diff)
                 )
-                reward = chessPiece.value
+            reward = capturedPiece.value
 
         # Resetting some of the environment attributes
         self.currentPiece = None
@@ -298,13 +375,143 @@ class ChessGameAI:
         self.calculatedAllPlayer1Moves = False
         self.calculatedAllPlayer2Moves = False
         self.highlightedSquares = []
-        # Changing whose turn it is to play
-        self.playerTurn = (
-            self.player1 if self.playerTurn != self.player1 else self.player2
+
+        return reward
+
+    # Function to decode an encoded move into [piece, (x,y)], using the piece on the square it moves from
+    def decodeMove(self, move):
+        move = int(move)
+        return [
+            self.pieceAt[moveFromSquare(move)],
+            locationFromSquare(moveToSquare(move)),
+        ]
+
+    # Function to make a move on the game state, without updating the display
+    # The move is [piece, (x,y)] or an encoded move, and a record of the changes is pushed onto the undo stack
+    def make_move(self, action, promotion="Queen"):
+        if not isinstance(action, list):
+            promotion = movePromotion(action) or promotion
+            action = self.decodeMove(action)
+        piece, newLocation = action
+        oldLocation = piece.location
+        player = self.playerTurn
+        opponent = self.player2 if player == self.player1 else self.player1
+        # Defining how much movement happened
+        movement = (newLocation[0] - oldLocation[0], newLocation[1] - oldLocation[1])
+
+        # Checking whether the move has captured any pieces, by looking up the new location
+        newSquare = squareFromLocation(newLocation)
+        capturedPiece = self.pieceAt[newSquare]
+        capturedIdx = None
+        # Moving from or to a king or rook square loses the castling rights that need it
+        castlingRights = self.board.castlingRights
+        self.board.setCastlingRights(
+            castlingRights
+            & CASTLING_MASKS[squareFromLocation(oldLocation)]
+            & CASTLING_MASKS[newSquare]
         )
+        if capturedPiece is not None:
+            # Capturing the piece (taking it off the board), remembering where it was in the list
+            capturedIdx = opponent.chessPieces.index(capturedPiece)
+            opponent.chessPieces.pop(capturedIdx)
+            self.board.removePiece(capturedPiece.tensor_idx, newLocation)
+
+        self.relocatePiece(piece, newLocation)  # Moving the piece to the location
+
+        # If the current piece tracks self.moved and hasn't been moved yet, update it
+        movedBefore = None
+        if isinstance(piece, (Pawn, Rook, King)):
+            movedBefore = piece.moved
+            piece.moved = True
+
+        # If the pawn reaches the final rank, promote the pawn
+        promotedPiece = None
+        pawnIdx = None
+        if isinstance(piece, Pawn):
+            final_rank = (
+                1 if piece.color == "white" else 8
+            )  # Finding that pieces final rank
+            if newLocation[1] == final_rank:
+                pawnIdx = player.chessPieces.index(piece)
+                promotedPiece = self.promote_pawn(promotion, piece)
+
+        # If the king makes a castling move, move the rook aswell to the correct place
+        rook = None
+        rookOldLocation = None
+        if isinstance(piece, King) and movement in ((-2, 0), (2, 0)):
+            if movement == (-2, 0):
+                # Queenside castling
+                rook = self.pieceAt[newSquare - 2]
+                newRookLocation = (newLocation[0] + 1, newLocation[1])
+            else:
+                # Kingside castling
+                rook = self.pieceAt[newSquare + 1]
+                newRookLocation = (newLocation[0] - 1, newLocation[1])
+            rookOldLocation = rook.location
+            self.relocatePiece(rook, newRookLocation)
+
+        # Changing whose turn it is to play
+        self.playerTurn = opponent
         self.moveNmb += 1
 
-        return reward
+        record = MoveRecord(
+            piece,
+            oldLocation,
+            movedBefore,
+            castlingRights,
+            capturedPiece,
+            capturedIdx,
+            rook,
+            rookOldLocation,
+            promotedPiece,
+            pawnIdx,
+        )
+        self.undoStack.append(record)
+        return record
+
+    # Function to unmake the last move made, restoring the game state from its record
+    def unmake_move(self):
+        record = self.undoStack.pop()
+        # Changing the turn back to the player who made the move
+        opponent = self.playerTurn
+        player = self.player2 if opponent == self.player1 else self.player1
+        self.playerTurn = player
+        self.moveNmb -= 1
+
+        piece = record.piece
+        newLocation = piece.location
+
+        # Swapping the promoted piece back into the pawn
+        if record.promotedPiece is not None:
+            player.chessPieces.remove(record.promotedPiece)
+            player.chessPieces.insert(record.pawnIdx, piece)
+            self.board.removePiece(record.promotedPiece.tensor_idx, newLocation)
+            self.board.addPiece(piece.tensor_idx, newLocation)
+            self.pieceAt[squareFromLocation(newLocation)] = piece
+            self.chessPieceId -= 1
+
+        # Moving the castling rook and then the piece back to where they were
+        if record.rook is not None:
+            self.relocatePiece(record.rook, record.rookOldLocation)
+        self.relocatePiece(piece, record.oldLocation)
+        if record.movedBefore is not None:
+            piece.moved = record.movedBefore
+        self.board.setCastlingRights(record.castlingRights)
+
+        # Putting any captured piece back on the board, in its original place within the list
+        if record.capturedPiece is not None:
+            opponent.chessPieces.insert(record.capturedIdx, record.capturedPiece)
+            self.board.addPiece(record.capturedPiece.tensor_idx, newLocation)
+            self.pieceAt[squareFromLocation(newLocation)] = record.capturedPiece
+
+        return record
+
+    # Function to move a piece to an empty location, keeping the board and square lookup up to date
+    def relocatePiece(self, piece, newLocation):
+        self.board.movePiece(piece.tensor_idx, piece.location, newLocation)
+        self.pieceAt[squareFromLocation(piece.location)] = None
+        self.pieceAt[squareFromLocation(newLocation)] = piece
+        piece.location = newLocation
 
     # Function to calculate a players score
     def calculateScore(self, player):
@@ -320,9 +527,12 @@ class ChessGameAI:
         return val
 
     # Allowing the user for Pawn Promotion, given the option they select
-    def promote_pawn(self, piece_name):
-        x, y = self.currentPiece.location
-        color = self.currentPiece.color
+    # The pawn defaults to the current piece, and the new piece is returned
+    def promote_pawn(self, piece_name, pawn=None):
+        if pawn is None:
+            pawn = self.currentPiece
+        x, y = pawn.location
+        color = pawn.color
 
         piece_classes = {
             "Queen": Queen,
@@ -333,20 +543,32 @@ class ChessGameAI:
 
         # Creating the new piece
         new_piece = piece_classes[piece_name](
-            x, y, color, self.chessPieceId, self.blockSize
+            x, y, color, self.chessPieceId, self.imageSize
         )
         self.chessPieceId += 1
 
-        # Replace the pawn with the new piece
-        self.playerTurn.chessPieces.remove(self.currentPiece)
-        self.playerTurn.chessPieces.append(new_piece)
+        # Replace the pawn with the new piece, in the pawn owner's pieces
+        player = self.player1 if color == self.player1.color else self.player2
+        player.chessPieces.remove(pawn)
+        player.chessPieces.append(new_piece)
+        self.board.removePiece(pawn.tensor_idx, (x, y))
+        self.board.addPiece(new_piece.tensor_idx, (x, y))
+        self.pieceAt[squareFromLocation((x, y))] = new_piece
+
+        return new_piece
 
     # Using pygame clock to limit amount of actions
     def getClock(self):
+        global clock
+        if clock is None:
+            clock = pygame.time.Clock()
         return clock
 
     # Function to ensure that all the games events have been processed
     def ensureProcessedEvents(self):
+        if self.headless:
+            return
+
         # Processing pygame events, if any
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
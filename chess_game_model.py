@@ -2,8 +2,27 @@ import torch
 import torch.nn as nn
 import torch.optim as optim
 import torch.nn.functional as F
+from chess_state_packing import STATE_SHAPE, isPacked, unpackStates
+from chess_move_encoding import moveAction
+import numpy as np
 import os
 
+# Number of inputs to the model, every square of every plane of the state (13 x 8 x 8)
+STATE_SIZE = 832
+
+
+# Function to turn states (one state or a batch, packed or not) into a float tensor for the model
+# Packed states are unpacked here, right before the model runs, and each state is flattened into one row
+def stateTensor(states):
+    states = np.asarray(states)
+    if isPacked(states):
+        states = unpackStates(states)
+    states = torch.as_tensor(states).float()
+    # States which have already been flattened are left as they are
+    if states.shape[-3:] == STATE_SHAPE:
+        states = states.flatten(-3)
+    return states
+
 
 class LinearQNet(nn.Module):
     def __init__(self, input_size, hidden_size, output_size):
@@ -45,49 +64,70 @@ class QTrainer:
         # Our Loss Function is the Mean Squared Error function
         self.criterion = nn.MSELoss()
 
-    # Converting a (x,y) tuple into a idx
-    def getIndexFromCoordinate(self, coordinate):
-        x, y = coordinate[0] - 1, coordinate[1] - 1
-        return x + y * 8
-
-    # Training the model
+    # Training the model, on one transition or lists of transitions (with the moves encoded)
     def train_step(self, state, final_move, reward, next_state, checkmate):
-        # Converting some of the inputs to tensors
-        state = torch.tensor(state, dtype=torch.float)
-        next_state = torch.tensor(next_state, dtype=torch.float)
-        reward = torch.tensor(reward, dtype=torch.float)
+        # Stacking lists of states into one array, the conversion to tensors is left to train_batch
+        state = np.asarray(state)
+        next_state = np.asarray(next_state)
+        reward = np.asarray(reward, dtype=np.float32)
+        checkmate = np.asarray(checkmate, dtype=np.float32)
 
         # Checking if we are working with 1 value or lists of values
-        if len(state.shape) == 3:
+        # One state is 13x8x8, or 1D if it's packed or flattened
+        if state.ndim == 1 or state.shape == STATE_SHAPE:
             # Needs these attributes in the form (1,x) so this is what the code below is doing
             # If we have a list of attributes, they are already in this form so we don't need to worry then
-            state = torch.unsqueeze(state, 0)
-            next_state = torch.unsqueeze(next_state, 0)
-            reward = torch.unsqueeze(reward, 0)
+            state = np.expand_dims(state, 0)
+            next_state = np.expand_dims(next_state, 0)
+            reward = np.expand_dims(reward, 0)
+            checkmate = np.expand_dims(checkmate, 0)
             final_move = (final_move,)
 
-        # Predict the Q values with the current state
+        # Getting the action of each move (its from and to squares), which the model predicted
+        moveIdxs = moveAction(np.asarray(final_move, dtype=np.int64))
+
+        self.train_batch(state, moveIdxs, reward, next_state, checkmate)
+
+    # Training the model on a batch of transitions, with the actions as indexes (e.g. from the ReplayBuffer)
+    # The whole batch is trained with one forward pass over the states, one over the next states and one backward pass
+    # weights are the importance weights of prioritized replay (None weights every transition equally)
+    # Returns the TD error of every transition, used to update their priorities
+    def train_batch(self, state, moveIdxs, reward, next_state, checkmate, weights=None):
+        # Converting the arrays to tensors, sharing their memory where the type already matches
+        state = stateTensor(state)
+        next_state = stateTensor(next_state)
+        moveIdxs = torch.as_tensor(moveIdxs, dtype=torch.long)
+        reward = torch.as_tensor(reward, dtype=torch.float)
+        checkmate = torch.as_tensor(checkmate, dtype=torch.float)
+
+        # Predict the Q values of every action with the current state
         pred = self.model(state)
-        # Creating a clone of the prediction
-        target = pred.clone()
-        # Going over all the values given
-        for idx in range(len(state)):
-            # Setting Q_new to be the reward at the current index
-            Q_new = reward
-            # Applying the formula to get the next set of parameters
-            # Only multiple by 1 value, the max of the predicted Q value for the next state
-            Q_new = Q_new + self.gamma * torch.max(self.model(next_state[idx]))
-            Q_new = Q_new if not Q_new[0] else Q_new[0]
-
-            # Getting the coordinate for the move at the current idx
-            moveIdx = self.getIndexFromCoordinate(final_move[idx][1])
-
-            # Setting the new target value to be Q_new at the maximum value of action
-            target[0][0][0][moveIdx] = Q_new
+
+        # Getting the max predicted Q value of every next state, in one pass without gradients
+        with torch.no_grad():
+            nextQ = self.model(next_state).max(dim=1).values
+        # Q_new = reward + gamma * max(next Q), with no future value once the game has finished
+        Q_new = reward + self.gamma * nextQ * (1 - checkmate)
+
+        # Creating the target, the prediction with Q_new at each move's action
+        target = pred.detach().clone()
+        target.scatter_(1, moveIdxs.unsqueeze(1), Q_new.unsqueeze(1))
+
+        # The TD error, how far each move's predicted Q value is from Q_new
+        tdErrors = Q_new - pred.detach().gather(1, moveIdxs.unsqueeze(1))[:, 0]
 
         # Applying the Loss Function
         self.optimiser.zero_grad()  # Emptying the gradient (step needed to learn within PyTorch)
-        loss = self.criterion(target, pred)
+        if weights is None:
+            loss = self.criterion(pred, target)
+        else:
+            # Only the moves' Q values differ from the target, so the weighted MSE only needs those
+            # Dividing by the number of outputs keeps it equal to the MSE when all the weights are 1
+            movePred = pred.gather(1, moveIdxs.unsqueeze(1))[:, 0]
+            weights = torch.as_tensor(weights, dtype=torch.float)
+            loss = (weights * (Q_new - movePred) ** 2).sum() / pred.numel()
         loss.backward()  # Applying backpropagation
 
         self.optimiser.step()
+
+        return tdErrors.numpy()
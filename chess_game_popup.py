@@ -1,10 +1,9 @@
 import pygame
+from chess_sprites import getScaledImage
 
-pygame.init()
-
-# Screen setup
-screen = pygame.display.set_mode((340, 340))
-font = pygame.font.SysFont(None, 36)
+# Screen setup, done when the popup is first shown so importing this module has no side effects
+screen = None
+font = None
 
 # Colors
 WHITE = (255, 255, 255)
@@ -12,13 +11,18 @@ GRAY = (200, 200, 200)
 BLACK = (0, 0, 0)
 BLUE = (0, 120, 215)
 
-# Object to get the images
-images = {
-    "Queen": "./images/queen.png",
-    "Knight": "./images/knight.png",
-    "Rook": "./images/rook.png",
-    "Bishop": "./images/bishop.png",
-}
+
+# Function to set up pygame and the popup's screen, the first time the popup is shown
+# The popup is drawn onto the game's window if one is already open
+def init_popup():
+    global screen, font
+    if screen is not None:
+        return
+    pygame.init()
+    screen = pygame.display.get_surface()
+    if screen is None:
+        screen = pygame.display.set_mode((340, 340))
+    font = pygame.font.SysFont(None, 36)
 
 
 def draw_button(rect, text, selected=False):
@@ -26,9 +30,8 @@ def draw_button(rect, text, selected=False):
     pygame.draw.rect(screen, color, rect)
     pygame.draw.rect(screen, BLACK, rect, 2)
 
-    imageSrc = images[text]
-    image = pygame.image.load(imageSrc).convert_alpha()
-    scaled_image = pygame.transform.scale(image, (120, 120))
+    # Getting the image from the shared sprite cache, rather than loading it on every draw
+    scaled_image = getScaledImage(text, "white", (120, 120))
     screen.blit(
         scaled_image,
         (
@@ -39,6 +42,7 @@ def draw_button(rect, text, selected=False):
 
 
 def show_popup():
+    init_popup()
     popup_rect = pygame.Rect(0, 0, 340, 340)
     button_width, button_height = 140, 140
     spacing = 20
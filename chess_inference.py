@@ -0,0 +1,46 @@
+from chess_game_model import stateTensor
+import torch
+import torch.nn as nn
+import copy
+import warnings
+
+
+# Class for an inference-only copy of a LinearQNet, used to choose moves when the model isn't being trained
+# The copy is compiled with TorchScript and frozen, and can be quantized to int8 to make it faster on CPUs
+# It doesn't follow changes to the model, so it's rebuilt (with update) whenever new weights are loaded
+class InferenceModel:
+    def __init__(self, model, quantize=False, script=True):
+        self.quantize = quantize
+        self.script = script
+        self.update(model)
+
+    # Function to rebuild the compiled copy from the model's current weights
+    def update(self, model):
+        model = copy.deepcopy(model).eval()
+        # Silencing the deprecation warnings torch gives for quantization and TorchScript
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            if self.quantize:
+                # Dynamic quantization stores the weights as int8, and quantizes the inputs as it runs
+                model = torch.ao.quantization.quantize_dynamic(
+                    model, {nn.Linear}, dtype=torch.qint8
+                )
+            if self.script:
+                # Freezing inlines the weights into the compiled graph, as they never change
+                model = torch.jit.freeze(torch.jit.script(model))
+        self.model = model
+
+    # Function to save the compiled model, so it can be loaded with torch.jit.load without this code
+    def save(self, file_path):
+        if not self.script:
+            raise ValueError("Only a TorchScript model can be saved")
+        torch.jit.save(self.model, file_path)
+
+    # Function to get the Q value of every action for a state or a batch of states (packed or not)
+    def __call__(self, states):
+        states = stateTensor(states)
+        with torch.inference_mode():
+            # The quantized layers only take batches, so a single state is run as a batch of one
+            if states.dim() == 1:
+                return self.model(states.unsqueeze(0))[0]
+            return self.model(states)
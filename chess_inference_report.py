@@ -0,0 +1,93 @@
+from chess_game_agent import ChessAgent
+from chess_inference import InferenceModel
+from chess_vector_environment import VectorChessGame
+import numpy as np
+import torch
+import argparse
+import random
+import statistics
+import time
+
+
+# Function to collect positions (packed states and legal action masks) from random headless games
+def collectPositions(numPositions, numGames=8, seed=0):
+    random.seed(seed)
+    env = VectorChessGame(numGames, maxMoves=200, packed=True)
+    states = []
+    masks = []
+    gameStates, gameMasks = env.reset()
+    while len(states) < numPositions:
+        states.extend(gameStates)
+        masks.extend(gameMasks)
+        actions = [random.choice(np.flatnonzero(mask)) for mask in gameMasks]
+        gameStates, gameMasks, _, _, _ = env.step(actions)
+    return np.stack(states[:numPositions]), np.stack(masks[:numPositions])
+
+
+# Function to choose the action for every position one at a time, as an actor does, timing each decision
+def timeDecisions(predict, states, masks):
+    actions = np.zeros(len(states), dtype=np.int64)
+    latencies = []
+    for idx in range(len(states)):
+        startTime = time.perf_counter()
+        prediction = predict(states[idx])
+        prediction = prediction.masked_fill(
+            ~torch.from_numpy(masks[idx]), float("-inf")
+        )
+        actions[idx] = torch.argmax(prediction).item()
+        latencies.append(time.perf_counter() - startTime)
+    return actions, latencies
+
+
+# Function to compare the per-move latency and the moves chosen by the float model and its compiled copies
+def runReport(numPositions, modelPath=None, seed=0):
+    torch.manual_seed(seed)
+    agent = ChessAgent()
+    if modelPath is not None:
+        agent.loadModel(modelPath)
+    agent.model.eval()
+    states, masks = collectPositions(numPositions, seed=seed)
+
+    variants = {
+        "eager float": agent.predict,
+        "script float": InferenceModel(agent.model),
+        "script int8": InferenceModel(agent.model, quantize=True),
+    }
+    # Warming up every variant, so the first calls' setup isn't timed
+    for predict in variants.values():
+        for state in states[:10]:
+            predict(state)
+
+    results = {}
+    for name, predict in variants.items():
+        actions, latencies = timeDecisions(predict, states, masks)
+        results[name] = (actions, latencies)
+
+    referenceActions, referenceLatencies = results["eager float"]
+    print(f"{numPositions} positions, torch {torch.__version__}")
+    for name, (actions, latencies) in results.items():
+        meanLatency = statistics.mean(latencies) * 1e6
+        p50 = statistics.median(latencies) * 1e6
+        speedup = statistics.mean(referenceLatencies) / statistics.mean(latencies)
+        agreement = (actions == referenceActions).mean() * 100
+        print(
+            f"{name:<13} mean {meanLatency:8.1f}us  p50 {p50:8.1f}us  "
+            f"speedup {speedup:5.2f}x  agreement {agreement:6.2f}%"
+        )
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare the latency and moves of the float, TorchScript and int8 models"
+    )
+    parser.add_argument("--positions", type=int, default=500)
+    parser.add_argument(
+        "--model",
+        default=None,
+        help="Saved model to load (random weights if not given)",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    runReport(args.positions, args.model, args.seed)
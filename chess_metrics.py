@@ -0,0 +1,119 @@
+import json
+import os
+import time
+
+
+# Class for a timer of one phase, used as `with timers.time("phase"):`
+# The timers are reused rather than made on every call, to keep the overhead low
+class PhaseTimer:
+    def __init__(self, timers, name):
+        self.timers = timers
+        self.name = name
+        self.startTime = 0.0
+
+    def __enter__(self):
+        self.startTime = time.perf_counter()
+
+    def __exit__(self, *exception):
+        self.timers.add(self.name, time.perf_counter() - self.startTime)
+
+
+# Class to keep the total time and calls of each phase of training, and counters (e.g. moves and games)
+# They are cheap enough to always be on, and are written to a file every interval seconds (see maybeWrite)
+# Phases shouldn't be timed inside each other, so each phase's share of the wall time is its own
+# Files ending in .prom are written in the Prometheus text format, anything else is appended to as JSONL
+class PhaseTimers:
+    def __init__(self, path=None, interval=60.0):
+        self.path = path
+        self.interval = interval
+        self.totals = {}
+        self.calls = {}
+        self.counters = {}
+        self.timers = {}
+        self.startTime = time.perf_counter()
+        self.lastWrite = self.startTime
+
+    # Function to get the timer of a phase
+    def time(self, name):
+        timer = self.timers.get(name)
+        if timer is None:
+            timer = self.timers[name] = PhaseTimer(self, name)
+        return timer
+
+    # Function to add the time taken by one call of a phase
+    def add(self, name, elapsed):
+        self.totals[name] = self.totals.get(name, 0.0) + elapsed
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    # Function to add to a counter
+    def count(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    # Function to get all the timings and counters as a dictionary
+    def snapshot(self):
+        elapsed = time.perf_counter() - self.startTime
+        return {
+            "time": time.time(),
+            "elapsed": elapsed,
+            "counters": dict(self.counters),
+            "movesPerSec": self.counters.get("moves", 0) / max(elapsed, 1e-9),
+            "gamesPerHour": self.counters.get("games", 0) * 3600 / max(elapsed, 1e-9),
+            "phases": {
+                name: {
+                    "seconds": total,
+                    "calls": self.calls[name],
+                    "meanMs": total * 1000 / self.calls[name],
+                    "share": total / max(elapsed, 1e-9),
+                }
+                for name, total in self.totals.items()
+            },
+        }
+
+    # Function to write the timings to the file, if interval seconds have passed since the last write
+    def maybeWrite(self):
+        if self.path is None:
+            return
+        now = time.perf_counter()
+        if now - self.lastWrite >= self.interval:
+            self.lastWrite = now
+            self.write()
+
+    # Function to write the timings to the file now
+    def write(self):
+        snapshot = self.snapshot()
+        if self.path.endswith(".prom"):
+            # The Prometheus file is replaced in one rename, so it's never read half written
+            tempPath = self.path + ".tmp"
+            with open(tempPath, "w") as file:
+                file.write(self.prometheusText(snapshot))
+            os.replace(tempPath, self.path)
+        else:
+            with open(self.path, "a") as file:
+                file.write(json.dumps(snapshot) + "\n")
+
+    # Function to format a snapshot in the Prometheus text format
+    def prometheusText(self, snapshot):
+        lines = [
+            "# TYPE chess_phase_seconds_total counter",
+            *[
+                f'chess_phase_seconds_total{{phase="{name}"}} {phase["seconds"]}'
+                for name, phase in snapshot["phases"].items()
+            ],
+            "# TYPE chess_phase_calls_total counter",
+            *[
+                f'chess_phase_calls_total{{phase="{name}"}} {phase["calls"]}'
+                for name, phase in snapshot["phases"].items()
+            ],
+            "# TYPE chess_events_total counter",
+            *[
+                f'chess_events_total{{event="{name}"}} {value}'
+                for name, value in snapshot["counters"].items()
+            ],
+            "# TYPE chess_moves_per_second gauge",
+            f"chess_moves_per_second {snapshot['movesPerSec']}",
+            "# TYPE chess_games_per_hour gauge",
+            f"chess_games_per_hour {snapshot['gamesPerHour']}",
+            "# TYPE chess_elapsed_seconds gauge",
+            f"chess_elapsed_seconds {snapshot['elapsed']}",
+        ]
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,50 @@
+from collections import OrderedDict
+
+
+# Class to store the legal moves and attack planes of recently seen positions, keyed by the position's hash
+# Once the cache holds maxSize positions, the least recently used position is dropped
+class PositionCache:
+    def __init__(self, maxSize=50000):
+        self.maxSize = maxSize
+        self.entries = OrderedDict()
+        # Counting how often a lookup found the position or not
+        self.hits = 0
+        self.misses = 0
+
+    # Function to get a stored value for a position (None if it isn't stored)
+    # name is the kind of value, e.g. "moves" or "vulnerableSquares"
+    def get(self, key, name):
+        entry = self.entries.get(key)
+        if entry is None or name not in entry:
+            self.misses += 1
+            return None
+        # Marking the position as the most recently used
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[name]
+
+    # Function to store a value for a position
+    def put(self, key, name, value):
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = self.entries[key] = {}
+            # Dropping the least recently used position if the cache is full
+            if len(self.entries) > self.maxSize:
+                self.entries.popitem(last=False)
+        else:
+            self.entries.move_to_end(key)
+        entry[name] = value
+
+    # Function to get the fraction of lookups which found the position
+    def hitRate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    # Function to empty the cache and its counters
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
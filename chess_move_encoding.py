@@ -0,0 +1,47 @@
+import numpy as np
+
+# Moves are encoded as 16 bit integers, rather than [piece, (x,y)] lists
+# Bits 0-5 are the square moved from, bits 6-11 the square moved to,
+# bits 12-13 the piece a pawn is promoted to and bits 14-15 the flags
+# The squares are numbered (x - 1) + (y - 1) * 8, as on the bitboards
+PROMOTION_PIECES = ("Knight", "Bishop", "Rook", "Queen")
+FLAG_PROMOTION = 1
+FLAG_CASTLING = 2
+
+# Type of the arrays of moves
+MOVE_DTYPE = np.uint16
+
+# Number of actions the model chooses between, one for every (from square, to square) pair
+# The action of a move is its first 12 bits, from square + to square * 64
+NUM_ACTIONS = 4096
+
+
+# Function to encode a move into a 16 bit integer
+def encodeMove(fromSquare, toSquare, promotion=None, flags=0):
+    promotionIdx = 0 if promotion is None else PROMOTION_PIECES.index(promotion)
+    return fromSquare | toSquare << 6 | promotionIdx << 12 | flags << 14
+
+
+# Functions to read the parts of encoded moves
+# These work on one move or on an array of moves at once
+def moveFromSquare(move):
+    return move & 63
+
+
+def moveToSquare(move):
+    return move >> 6 & 63
+
+
+def moveFlags(move):
+    return move >> 14 & 3
+
+
+def moveAction(move):
+    return move & 4095
+
+
+# Function to get the piece a move promotes to (None if the move isn't a promotion)
+def movePromotion(move):
+    if not moveFlags(move) & FLAG_PROMOTION:
+        return None
+    return PROMOTION_PIECES[move >> 12 & 3]
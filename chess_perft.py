@@ -0,0 +1,139 @@
+from chess_game_environment import ChessGameAI
+from chess_game_agent import ChessAgent
+import argparse
+import time
+
+# Standard perft test positions, with the number of leaf nodes at each depth (depth 1 first)
+# The game has no en passant and pawns always promote to a Queen, so the counts are for those rules
+# They match the published counts for depths 1-4 of "start", every depth of "position6", and the first
+# depths of the others (depth 5 of "start" is 258 under the published count, which has en passant captures)
+PERFT_POSITIONS = {
+    "start": (
+        "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+        [20, 400, 8902, 197281, 4865351],
+    ),
+    "kiwipete": (
+        "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+        [48, 2038, 97766],
+    ),
+    "position3": (
+        "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+        [14, 191, 2810, 43087, 671300],
+    ),
+    "position4": (
+        "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+        [6, 228, 8083, 320639],
+    ),
+    "position5": (
+        "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+        [41, 1373, 54007],
+    ),
+    "position6": (
+        "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+        [46, 2079, 89890, 3894594],
+    ),
+}
+
+
+# Function to count the leaf nodes of the move tree to a depth, making and unmaking every move
+def perft(game, depth):
+    if depth == 0:
+        return 1
+    player = game.playerTurn
+    opponent = game.player2 if player == game.player1 else game.player1
+    moves = player.calculateAllPossibleMoves(True, opponent, opponent.chessPieces)
+    # The moves at the last depth are the leaves, so they don't need making
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        game.make_move(move)
+        nodes += perft(game, depth - 1)
+        game.unmake_move()
+    return nodes
+
+
+# Function to split the perft count by the first move, used to find which move is miscounted
+def divide(game, depth):
+    player = game.playerTurn
+    opponent = game.player2 if player == game.player1 else game.player1
+    results = {}
+    for move in player.calculateAllPossibleMoves(True, opponent, opponent.chessPieces):
+        fromLocation = move[0].location
+        game.make_move(move)
+        results[(type(move[0]).__name__, fromLocation, move[1])] = perft(
+            game, depth - 1
+        )
+        game.unmake_move()
+    return results
+
+
+# Function to run perft on the test positions, checking the counts and timing the move generation
+def runPerft(positionNames, maxDepth, useCache=False):
+    game = ChessGameAI(ChessAgent(), ChessAgent(), headless=True)
+    # The legal move cache is turned off by default, so the move generation itself is measured
+    if not useCache:
+        game.moveCache = None
+
+    failures = 0
+    totalNodes = 0
+    totalTime = 0.0
+    for name in positionNames:
+        fen, expectedCounts = PERFT_POSITIONS[name]
+        for depth in range(1, min(maxDepth, len(expectedCounts)) + 1):
+            game.loadFen(fen)
+            startTime = time.perf_counter()
+            nodes = perft(game, depth)
+            elapsed = time.perf_counter() - startTime
+            totalNodes += nodes
+            totalTime += elapsed
+
+            expected = expectedCounts[depth - 1]
+            status = (
+                "ok" if nodes == expected else "FAIL (expected " + str(expected) + ")"
+            )
+            if nodes != expected:
+                failures += 1
+            print(
+                f"{name:<10} depth {depth}  nodes {nodes:>9}  "
+                f"{elapsed:8.3f}s  {nodes / max(elapsed, 1e-9):>10.0f} nodes/sec  {status}"
+            )
+
+    print(
+        f"Total : {totalNodes} nodes in {totalTime:.3f}s "
+        f"({totalNodes / max(totalTime, 1e-9):.0f} nodes/sec), {failures} failures"
+    )
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Perft move generation test")
+    parser.add_argument("--depth", type=int, default=3, help="Maximum depth to search")
+    parser.add_argument(
+        "--positions",
+        nargs="+",
+        default=list(PERFT_POSITIONS),
+        choices=list(PERFT_POSITIONS),
+        help="Test positions to run",
+    )
+    parser.add_argument(
+        "--cache", action="store_true", help="Use the legal move cache while searching"
+    )
+    parser.add_argument(
+        "--divide",
+        action="store_true",
+        help="Print the node count after each first move, at the maximum depth",
+    )
+    args = parser.parse_args()
+
+    if args.divide:
+        game = ChessGameAI(ChessAgent(), ChessAgent(), headless=True)
+        game.moveCache = None
+        for name in args.positions:
+            game.loadFen(PERFT_POSITIONS[name][0])
+            print(name)
+            for move, nodes in divide(game, args.depth).items():
+                print("   ", move, nodes)
+        raise SystemExit(0)
+
+    raise SystemExit(1 if runPerft(args.positions, args.depth, args.cache) else 0)
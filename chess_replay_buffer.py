@@ -0,0 +1,208 @@
+from chess_state_packing import PACKED_STATE_SIZE, packStates
+from chess_move_encoding import MOVE_DTYPE, moveAction
+import numpy as np
+import os
+
+
+# Class to store the agent's memory of transitions in fixed size arrays, used as a ring buffer
+# Once the buffer is full, the oldest transitions are overwritten (like a deque with a maxlen)
+class ReplayBuffer:
+    def __init__(self, capacity):
+        self.capacity = capacity
+        # The states only hold 0s and 1s, so they are stored packed, as one bit per square
+        # They are returned packed too, and only unpacked by the trainer right before the model runs
+        self.states = np.zeros((capacity, PACKED_STATE_SIZE), dtype=np.uint8)
+        self.nextStates = np.zeros((capacity, PACKED_STATE_SIZE), dtype=np.uint8)
+        # The moves are stored encoded, and the action of each move is its from and to squares (0-4095)
+        self.moves = np.zeros(capacity, dtype=MOVE_DTYPE)
+        self.rewards = np.zeros(capacity, dtype=np.float32)
+        self.dones = np.zeros(capacity, dtype=np.float32)
+        # Index the next transition is written to, and the number of transitions stored
+        self.nextIdx = 0
+        self.size = 0
+
+    # Function to add a transition to the buffer, overwriting the oldest if it's full
+    # The move is an encoded move, so the buffer holds no references to the game's pieces
+    def append(self, transition):
+        state, move, reward, nextState, done = transition
+        idx = self.nextIdx
+        self.states[idx] = packStates(state)
+        self.moves[idx] = move
+        self.rewards[idx] = reward
+        self.nextStates[idx] = packStates(nextState)
+        self.dones[idx] = done
+        self.nextIdx = (idx + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    # Function to get a random batch of transitions, as (states, actions, rewards, next states, dones) arrays
+    # If the buffer holds no more than batchSize transitions, all of them are returned
+    def sample(self, batchSize):
+        if self.size <= batchSize:
+            indices = np.arange(self.size)
+        else:
+            indices = np.random.randint(0, self.size, batchSize)
+        return self.getBatch(indices)
+
+    # Function to get the transitions at a set of indices, each as one contiguous array
+    def getBatch(self, indices):
+        return (
+            self.states[indices],
+            moveAction(self.moves[indices].astype(np.int64)),
+            self.rewards[indices],
+            self.nextStates[indices],
+            self.dones[indices],
+        )
+
+    # Function to save the buffer, there is nothing to save for a buffer held in memory
+    def flush(self):
+        pass
+
+    def __len__(self):
+        return self.size
+
+
+# Class to store the agent's memory in memory-mapped files on disk, rather than in RAM
+# It works the same as the ReplayBuffer, but its capacity is only limited by disk space
+# The files are reopened if they already exist, so the memory survives restarts
+class MemoryMappedReplayBuffer(ReplayBuffer):
+    def __init__(self, directory, capacity):
+        self.capacity = capacity
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.states = self.openArray("states", (capacity, PACKED_STATE_SIZE), np.uint8)
+        self.nextStates = self.openArray(
+            "nextStates", (capacity, PACKED_STATE_SIZE), np.uint8
+        )
+        self.moves = self.openArray("moves", (capacity,), MOVE_DTYPE)
+        self.rewards = self.openArray("rewards", (capacity,), np.float32)
+        self.dones = self.openArray("dones", (capacity,), np.float32)
+        # The next index and size are kept in a file too, so they are saved with every append
+        self.counters = self.openArray("counters", (2,), np.int64)
+
+    # Function to open one of the buffer's arrays, creating its file if it doesn't exist yet
+    def openArray(self, name, shape, dtype):
+        path = os.path.join(self.directory, name + ".npy")
+        if os.path.exists(path):
+            array = np.load(path, mmap_mode="r+")
+            if array.shape != shape or array.dtype != dtype:
+                raise ValueError(
+                    path
+                    + " doesn't match the buffer's capacity or format, so can't be reopened"
+                )
+            return array
+        return np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=shape)
+
+    # The next index and size are read from and written to the counters file
+    @property
+    def nextIdx(self):
+        return int(self.counters[0])
+
+    @nextIdx.setter
+    def nextIdx(self, value):
+        self.counters[0] = value
+
+    @property
+    def size(self):
+        return int(self.counters[1])
+
+    @size.setter
+    def size(self, value):
+        self.counters[1] = value
+
+    # Function to get the transitions at a set of indices
+    # The indices are sorted, so only the rows needed are read from disk, in order
+    def getBatch(self, indices):
+        return tuple(np.asarray(array) for array in super().getBatch(np.sort(indices)))
+
+    # Function to write any changes still held in memory out to the files
+    def flush(self):
+        for array in (
+            self.states,
+            self.nextStates,
+            self.moves,
+            self.rewards,
+            self.dones,
+            self.counters,
+        ):
+            array.flush()
+
+
+# Class for a sum-tree, a binary tree where every node holds the sum of the priorities below it
+# Updating a priority and finding the leaf at a point within the total priority are both O(log n)
+class SumTree:
+    def __init__(self, capacity):
+        # Rounding the number of leaves up to a power of 2, so every leaf is at the same depth
+        self.depth = max(1, (capacity - 1).bit_length())
+        self.leafCount = 1 << self.depth
+        # Node 1 is the root, the children of node i are 2i and 2i + 1, and the leaves start at leafCount
+        self.tree = np.zeros(2 * self.leafCount, dtype=np.float64)
+
+    # Function to get the sum of all the priorities
+    def total(self):
+        return self.tree[1]
+
+    # Function to get the priorities of a set of leaves
+    def get(self, indices):
+        return self.tree[self.leafCount + np.asarray(indices)]
+
+    # Function to set the priorities of a set of leaves, updating the sums above them one level at a time
+    def update(self, indices, priorities):
+        nodes = self.leafCount + np.asarray(indices)
+        self.tree[nodes] = priorities
+        for _ in range(self.depth):
+            nodes = np.unique(nodes // 2)
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+
+    # Function to find the leaves at a set of points within the total priority, descending the tree together
+    def find(self, values):
+        values = np.array(values, dtype=np.float64)
+        nodes = np.ones(len(values), dtype=np.int64)
+        for _ in range(self.depth):
+            leftSums = self.tree[2 * nodes]
+            goRight = values > leftSums
+            values -= leftSums * goRight
+            nodes = 2 * nodes + goRight
+        return nodes - self.leafCount
+
+
+# Class for a replay buffer which samples transitions by priority, using a sum-tree
+# Transitions with larger TD errors are sampled more often, and importance weights correct for the bias
+class PrioritizedReplayBuffer(ReplayBuffer):
+    def __init__(self, capacity, alpha=0.6, beta=0.4, betaIncrement=0.001):
+        super().__init__(capacity)
+        self.tree = SumTree(capacity)
+        self.alpha = alpha  # How much the priorities matter (0 is uniform sampling)
+        self.beta = beta  # How much the importance weights correct for the priorities, rising to 1
+        self.betaIncrement = betaIncrement
+        self.maxPriority = 1.0  # New transitions get the highest priority, so they are sampled at least once
+        self.minError = 1e-5  # Keeps every transition's priority above 0
+
+    # Function to add a transition to the buffer, with the highest priority so far
+    def append(self, transition):
+        idx = self.nextIdx
+        super().append(transition)
+        self.tree.update([idx], [self.maxPriority])
+
+    # Function to sample a batch by priority, one transition from each equal slice of the total priority
+    # Returns the batch, the indices of the transitions and their importance weights
+    def samplePrioritized(self, batchSize):
+        batchSize = min(batchSize, self.size)
+        total = self.tree.total()
+        values = (np.arange(batchSize) + np.random.random(batchSize)) * (
+            total / batchSize
+        )
+        indices = np.minimum(self.tree.find(values), self.size - 1)
+
+        # Importance weights, scaled so the largest weight is 1
+        probabilities = self.tree.get(indices) / total
+        weights = (self.size * probabilities) ** -self.beta
+        weights /= weights.max()
+        self.beta = min(1.0, self.beta + self.betaIncrement)
+
+        return self.getBatch(indices), indices, weights.astype(np.float32)
+
+    # Function to update the priorities of sampled transitions from their TD errors
+    def updatePriorities(self, indices, tdErrors):
+        priorities = (np.abs(tdErrors) + self.minError) ** self.alpha
+        self.tree.update(indices, priorities)
+        self.maxPriority = max(self.maxPriority, float(priorities.max()))
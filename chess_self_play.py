@@ -0,0 +1,217 @@
+from chess_game_agent import ChessAgent
+from chess_vector_environment import VectorChessGame
+from chess_checkpoint import CheckpointWriter
+from chess_metrics import PhaseTimers
+import torch
+import torch.multiprocessing as mp
+import argparse
+import queue
+import random
+import time
+
+
+# Function run by each self-play worker process
+# The worker plays its own headless games with a read-only copy of the learner's model
+# and sends the transitions to the learner, loading new weights whenever the learner sends them
+# If quantize, the worker's compiled model is quantized to int8
+def selfPlayWorker(
+    workerIdx, transitionQueue, weightQueue, stopEvent, numGames, maxMoves, quantize
+):
+    # Each worker uses one thread, so the workers scale across the cores
+    torch.set_num_threads(1)
+    random.seed(workerIdx)
+    torch.manual_seed(workerIdx)
+
+    agent = ChessAgent()
+    agent.model.eval()
+    # The worker never trains, so its moves are chosen with a compiled copy of the model
+    agent.useInferenceModel(quantize)
+    # The states are packed, so the transitions sent to the learner are 16x smaller
+    env = VectorChessGame(numGames, maxMoves=maxMoves, packed=True)
+    states, masks = env.reset()
+
+    while not stopEvent.is_set():
+        # Loading the latest weights from the learner, if any have been sent
+        try:
+            stateDict, n_games = weightQueue.get_nowait()
+            agent.loadWeights(stateDict)
+            agent.n_games = n_games
+        except queue.Empty:
+            pass
+
+        actions = agent.get_moves(states, masks)
+        nextStates, nextMasks, rewards, dones, truncated = env.step(actions)
+
+        # Building the transitions, with the encoded moves made so they hold no references to the games
+        # Only games which really finished are terminal, truncated games still have a future value
+        transitions = []
+        for gameIdx in range(numGames):
+            nextState = env.finalStates.get(gameIdx, nextStates[gameIdx])
+            transitions.append(
+                (
+                    states[gameIdx],
+                    int(env.lastMoves[gameIdx]),
+                    float(rewards[gameIdx]),
+                    nextState,
+                    bool(dones[gameIdx]),
+                )
+            )
+        # Only games which really finished count as games played
+        transitionQueue.put((workerIdx, transitions, int(dones.sum())))
+        states, masks = nextStates, nextMasks
+
+
+# Function to send the learner's weights to every worker
+# Only the newest weights matter, so any weights a worker hasn't loaded yet are replaced
+# The weights are cloned first, as the queue shares the tensors it's given with the workers
+# (sending the model's own tensors would let the workers see the learner's later updates)
+def pushWeights(agent, weightQueues):
+    stateDict = {
+        key: value.detach().clone() for key, value in agent.model.state_dict().items()
+    }
+    for weightQueue in weightQueues:
+        try:
+            weightQueue.get_nowait()
+        except queue.Empty:
+            pass
+        weightQueue.put((stateDict, agent.n_games))
+
+
+# Function to train one model from the games of several self-play worker processes
+# The learner owns the QTrainer, the workers only play games
+def trainSelfPlay(
+    numWorkers=2,
+    gamesPerWorker=8,
+    maxMoves=200,
+    syncEvery=20,
+    maxTransitions=None,
+    memoryDir=None,
+    prioritized=False,
+    quantize=False,
+    metricsPath=None,
+    metricsInterval=60.0,
+):
+    context = mp.get_context("spawn")
+    transitionQueue = context.Queue(maxsize=numWorkers * 4)
+    weightQueues = [context.Queue(maxsize=1) for _ in range(numWorkers)]
+    stopEvent = context.Event()
+
+    learner = ChessAgent(memoryDir, prioritized)
+    # The time the learner spends in each phase, written to metricsPath every metricsInterval seconds
+    timers = PhaseTimers(metricsPath, metricsInterval)
+    # Checkpoints are written from a background thread, so the learner doesn't wait on the disk
+    checkpointWriter = CheckpointWriter()
+    pushWeights(learner, weightQueues)
+
+    workers = [
+        context.Process(
+            target=selfPlayWorker,
+            args=(
+                workerIdx,
+                transitionQueue,
+                weightQueues[workerIdx],
+                stopEvent,
+                gamesPerWorker,
+                maxMoves,
+                quantize,
+            ),
+            daemon=True,
+        )
+        for workerIdx in range(numWorkers)
+    ]
+    for worker in workers:
+        worker.start()
+
+    transitionCount = 0
+    updates = 0
+    startTime = time.perf_counter()
+    try:
+        while maxTransitions is None or transitionCount < maxTransitions:
+            with timers.time("wait_for_transitions"):
+                workerIdx, transitions, finishedGames = transitionQueue.get()
+            transitionCount += len(transitions)
+            timers.count("moves", len(transitions))
+
+            # Training the short memory on the new transitions as one batch, and remembering them
+            states, actions, rewards, next_states, dones = zip(*transitions)
+            with timers.time("train_short_memory"):
+                learner.train_short_memory(states, actions, rewards, next_states, dones)
+            with timers.time("remember"):
+                for transition in transitions:
+                    learner.remember(*transition)
+            updates += 1
+
+            # Training the long memory whenever games have finished, as in train()
+            if finishedGames:
+                learner.n_games += finishedGames
+                timers.count("games", finishedGames)
+                with timers.time("train_long_memory"):
+                    learner.train_long_memory()
+
+            # Sending the updated weights back to the workers
+            if updates % syncEvery == 0:
+                with timers.time("sync"):
+                    pushWeights(learner, weightQueues)
+                    checkpointWriter.save(learner.model)
+                    learner.memory.flush()
+                elapsed = time.perf_counter() - startTime
+                print(
+                    f"{transitionCount} transitions, {learner.n_games} games, "
+                    f"{transitionCount / elapsed:.0f} transitions/sec"
+                )
+            timers.maybeWrite()
+    finally:
+        stopEvent.set()
+        # Emptying the queue, so workers blocked on putting transitions can exit
+        while any(worker.is_alive() for worker in workers):
+            try:
+                transitionQueue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        for worker in workers:
+            worker.join()
+        # Writing the last checkpoint and timings before returning
+        checkpointWriter.close()
+        if metricsPath is not None:
+            timers.write()
+
+    return learner
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Multi-process self-play training")
+    parser.add_argument("--workers", type=int, default=mp.cpu_count())
+    parser.add_argument("--games", type=int, default=8, help="Games per worker")
+    parser.add_argument("--max-moves", type=int, default=200)
+    parser.add_argument("--sync-every", type=int, default=20)
+    parser.add_argument("--transitions", type=int, default=None)
+    parser.add_argument(
+        "--memory-dir", default=None, help="Store the replay memory on disk here"
+    )
+    parser.add_argument(
+        "--prioritized", action="store_true", help="Use prioritized replay memory"
+    )
+    parser.add_argument(
+        "--quantize", action="store_true", help="Quantize the workers' models to int8"
+    )
+    parser.add_argument(
+        "--metrics",
+        default=None,
+        help="File to write the phase timings to (.prom for Prometheus, otherwise JSONL)",
+    )
+    parser.add_argument("--metrics-interval", type=float, default=60.0)
+    args = parser.parse_args()
+
+    print("Beginning self-play with " + str(args.workers) + " workers")
+    trainSelfPlay(
+        args.workers,
+        args.games,
+        args.max_moves,
+        args.sync_every,
+        args.transitions,
+        args.memory_dir,
+        args.prioritized,
+        args.quantize,
+        args.metrics,
+        args.metrics_interval,
+    )
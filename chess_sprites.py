@@ -0,0 +1,32 @@
+import pygame
+
+# Process-wide cache of the piece images, so every image is only loaded from disk and scaled once
+# The pieces and the promotion popup hold references to these surfaces rather than their own copies
+images = {}  # Keyed by (piece type, color)
+scaledImages = {}  # Keyed by (piece type, color, size)
+
+
+# Function to get the file of a piece's image, e.g. ("Pawn", "black") --> ./images/pawnBlack.png
+def spriteFile(pieceType, color):
+    suffix = "" if color == "white" else "Black"
+    return "./images/" + pieceType.lower() + suffix + ".png"
+
+
+# Function to get a piece's image, loading it the first time it's needed
+def getImage(pieceType, color):
+    key = (pieceType, color)
+    image = images.get(key)
+    if image is None:
+        image = pygame.image.load(spriteFile(pieceType, color)).convert_alpha()
+        images[key] = image
+    return image
+
+
+# Function to get a piece's image scaled to a (width, height) size, scaling it the first time it's needed
+def getScaledImage(pieceType, color, size):
+    key = (pieceType, color, size)
+    scaledImage = scaledImages.get(key)
+    if scaledImage is None:
+        scaledImage = pygame.transform.scale(getImage(pieceType, color), size)
+        scaledImages[key] = scaledImage
+    return scaledImage
@@ -0,0 +1,37 @@
+import numpy as np
+
+# Shape of the state of the board, given by ChessPlayer.get_state
+STATE_SHAPE = (13, 8, 8)
+# Number of bytes in a packed state, one bit for every square of every plane (13 x 64 bits)
+PACKED_STATE_SIZE = 104
+
+
+# Function to check if states (one state or a batch of them) are already packed
+# Unpacked states end with a row of 8 squares, packed states end with the 104 bytes
+def isPacked(states):
+    return np.shape(states)[-1] == PACKED_STATE_SIZE
+
+
+# Function to pack states (13 x 8 x 8 arrays of 0s and 1s) into 104 bytes each
+# Works on one state or a batch of them, and states which are already packed are returned as they are
+# Square [y - 1][x - 1] of each plane is bit (x - 1) + (y - 1) * 8, the same order as the bitboards
+def packStates(states):
+    states = np.asarray(states)
+    if isPacked(states):
+        return states
+    # np.packbits only takes integer arrays, so states of any other type (e.g. floats) are converted first
+    planes = states.reshape(states.shape[:-3] + (13 * 64,)).astype(np.uint8, copy=False)
+    return np.packbits(planes, axis=-1, bitorder="little")
+
+
+# Function to unpack packed states back into 13 x 8 x 8 arrays, in one vectorized step for a whole batch
+def unpackStates(packedStates, dtype=np.float32):
+    packedStates = np.asarray(packedStates)
+    bits = np.unpackbits(packedStates, axis=-1, bitorder="little")
+    return bits.reshape(packedStates.shape[:-1] + STATE_SHAPE).astype(dtype)
+
+
+# Function to pack 13 bitboards (the planes of a state) straight into a packed state
+# Each bitboard is stored as a little-endian 64 bit word, so its bytes hold the squares in order
+def packBitboards(bitboards):
+    return np.array(bitboards, dtype="<u8").view(np.uint8)
@@ -0,0 +1,107 @@
+# Precomputed lookup tables used for move generation, keyed by square index (0-63)
+# A square index is (x - 1) + (y - 1) * 8, the same as chess_bitboard.squareFromLocation
+
+# Defining the (x,y) step of each direction, indexed by the direction's integer id
+# The directions are named as seen from the black side of the board, so FORWARD is y + 1
+FORWARD, BACKWARD, LEFT, RIGHT = 0, 1, 2, 3
+FORWARD_RIGHT, FORWARD_LEFT, BACKWARD_RIGHT, BACKWARD_LEFT = 4, 5, 6, 7
+DIRECTION_OFFSETS = [
+    (0, 1),
+    (0, -1),
+    (-1, 0),
+    (1, 0),
+    (1, 1),
+    (-1, 1),
+    (1, -1),
+    (-1, -1),
+]
+
+# Defining the directions each sliding piece can move in
+ROOK_DIRECTIONS = (FORWARD, BACKWARD, LEFT, RIGHT)
+BISHOP_DIRECTIONS = (FORWARD_RIGHT, FORWARD_LEFT, BACKWARD_RIGHT, BACKWARD_LEFT)
+QUEEN_DIRECTIONS = ROOK_DIRECTIONS + BISHOP_DIRECTIONS
+
+# Defining the (x,y) jumps of the pieces which can't be blocked
+KNIGHT_OFFSETS = [
+    (x, y) for x in [-2, -1, 1, 2] for y in [-2, -1, 1, 2] if abs(x) != abs(y)
+]
+KING_OFFSETS = [
+    (x, y) for x in [-1, 0, 1] for y in [-1, 0, 1] if not (x == 0 and y == 0)
+]
+# Pawns capture diagonally forward, white moves up the board (y - 1) and black down it (y + 1)
+PAWN_ATTACK_OFFSETS = [[(-1, -1), (1, -1)], [(-1, 1), (1, 1)]]
+
+
+# Function to get the square reached by stepping from a square, or None if it's off the board
+def _offsetSquare(square, offset):
+    x = square % 8 + offset[0]
+    y = square // 8 + offset[1]
+    if 0 <= x < 8 and 0 <= y < 8:
+        return x + y * 8
+    return None
+
+
+# Function to make a bitboard out of a list of squares
+def _squaresToBitboard(squares):
+    bitboard = 0
+    for square in squares:
+        bitboard |= 1 << square
+    return bitboard
+
+
+# Function to build the list of squares a piece can jump to from every square
+def _leaperSquares(offsets):
+    return [
+        tuple(
+            target
+            for target in (_offsetSquare(square, offset) for offset in offsets)
+            if target is not None
+        )
+        for square in range(64)
+    ]
+
+
+# Function to build the squares along a direction from every square, closest first
+def _raySquares(offset):
+    rays = []
+    for square in range(64):
+        ray = []
+        target = _offsetSquare(square, offset)
+        while target is not None:
+            ray.append(target)
+            target = _offsetSquare(target, offset)
+        rays.append(tuple(ray))
+    return rays
+
+
+# Squares (and bitboards of the squares) a knight or king can jump to from each square
+KNIGHT_SQUARES = _leaperSquares(KNIGHT_OFFSETS)
+KING_SQUARES = _leaperSquares(KING_OFFSETS)
+KNIGHT_ATTACKS = [_squaresToBitboard(squares) for squares in KNIGHT_SQUARES]
+KING_ATTACKS = [_squaresToBitboard(squares) for squares in KING_SQUARES]
+
+# Squares (and bitboards) a pawn attacks from each square, indexed by color (0 white, 1 black)
+PAWN_ATTACK_SQUARES = [_leaperSquares(offsets) for offsets in PAWN_ATTACK_OFFSETS]
+PAWN_ATTACKS = [
+    [_squaresToBitboard(squares) for squares in colorSquares]
+    for colorSquares in PAWN_ATTACK_SQUARES
+]
+
+# Squares (and bitboards) along every direction from each square, indexed [direction][square]
+RAY_SQUARES = [_raySquares(offset) for offset in DIRECTION_OFFSETS]
+RAYS = [
+    [_squaresToBitboard(squares) for squares in directionSquares]
+    for directionSquares in RAY_SQUARES
+]
+
+# Direction from one square to another, indexed [fromSquare][toSquare] (-1 if not on a line)
+DIRECTION_BETWEEN = [[-1] * 64 for _ in range(64)]
+# Bitboard of the squares strictly between two squares on a line (0 if not on a line)
+BETWEEN = [[0] * 64 for _ in range(64)]
+for _direction, _directionSquares in enumerate(RAY_SQUARES):
+    for _square in range(64):
+        _between = 0
+        for _target in _directionSquares[_square]:
+            DIRECTION_BETWEEN[_square][_target] = _direction
+            BETWEEN[_square][_target] = _between
+            _between |= 1 << _target
@@ -0,0 +1,107 @@
+from chess_game_environment import ChessGameAI
+from chess_game_agent import ChessPlayer
+from chess_move_encoding import MOVE_DTYPE, NUM_ACTIONS, moveAction
+from chess_move_cache import PositionCache
+import numpy as np
+
+
+# Class to play many games in lockstep, so the moves of every game can be chosen with one batch
+# Every game is a headless ChessGameAI, and games which finish are reset in place
+# If packed, the states are packed into 104 bytes each (see chess_state_packing)
+class VectorChessGame:
+    def __init__(self, numGames, maxMoves=None, headless=True, packed=False):
+        self.numGames = numGames
+        self.packed = packed
+        # Games still going after maxMoves moves are stopped and reset (None to never stop them)
+        self.maxMoves = maxMoves
+        # The shared position cache means positions from any of the games are reused by all of them
+        self.moveCache = PositionCache()
+        self.games = [
+            ChessGameAI(
+                ChessPlayer(),
+                ChessPlayer(),
+                headless=headless,
+                moveCache=self.moveCache,
+            )
+            for _ in range(numGames)
+        ]
+        # The legal moves of the player to move in every game (as encoded moves), used to turn actions back into moves
+        self.legalMoves = [None] * numGames
+        # The last state of each game which finished during the last step, before it was reset
+        self.finalStates = {}
+        # The encoded move made in every game during the last step
+        self.lastMoves = np.zeros(numGames, dtype=MOVE_DTYPE)
+
+    # Function to reset every game, returning the stacked states and legal action masks
+    def reset(self):
+        for game in self.games:
+            game.reset()
+        return self.getStates(), self.getMasks()
+
+    # Function to get the state of every game, as seen by the player to move (N x 13 x 8 x 8, or N x 104 packed)
+    def getStates(self):
+        return np.stack(
+            [self.getState(gameIdx) for gameIdx in range(self.numGames)], axis=0
+        )
+
+    # Function to get the state of a game, as seen by the player to move
+    def getState(self, gameIdx):
+        game = self.games[gameIdx]
+        player = game.playerTurn
+        opponent = game.player2 if player == game.player1 else game.player1
+        if self.packed:
+            return player.get_packed_state(opponent)
+        return player.get_state(opponent)
+
+    # Function to get which actions are legal in every game (N x 4096, True if legal)
+    def getMasks(self):
+        masks = np.zeros((self.numGames, NUM_ACTIONS), dtype=bool)
+        for gameIdx in range(self.numGames):
+            masks[gameIdx] = self.getMask(gameIdx)
+        return masks
+
+    # Function to find the legal moves of a game, and mark their actions as legal
+    def getMask(self, gameIdx):
+        game = self.games[gameIdx]
+        player = game.playerTurn
+        opponent = game.player2 if player == game.player1 else game.player1
+        self.legalMoves[gameIdx] = player.calculateMoveCodes(opponent)
+        return player.calculateActionMask(self.legalMoves[gameIdx])
+
+    # Function to turn an action (the squares to move from and to) into the game's legal encoded move
+    def moveFromAction(self, gameIdx, action):
+        legalMoves = self.legalMoves[gameIdx]
+        matchingMoves = np.flatnonzero(moveAction(legalMoves) == action)
+        if len(matchingMoves) == 0:
+            raise ValueError(
+                "Action " + str(action) + " is not legal in game " + str(gameIdx)
+            )
+        return int(legalMoves[matchingMoves[0]])
+
+    # Function to make one move in every game, given an action for each game
+    # Returns the stacked states and masks of the next positions, the rewards, which games finished
+    # and which games were truncated (stopped after maxMoves moves, without finishing)
+    # The encoded moves made are kept in self.lastMoves
+    # Finished and truncated games are reset, so their returned state is the start of their next game
+    # (their last state is kept in self.finalStates)
+    def step(self, actions):
+        rewards = np.zeros(self.numGames, dtype=np.float32)
+        dones = np.zeros(self.numGames, dtype=bool)
+        truncated = np.zeros(self.numGames, dtype=bool)
+        self.finalStates = {}
+        for gameIdx, game in enumerate(self.games):
+            move = self.moveFromAction(gameIdx, int(actions[gameIdx]))
+            self.lastMoves[gameIdx] = move
+            reward, checkmate, score = game.play_step(move)
+            rewards[gameIdx] = reward
+            dones[gameIdx] = checkmate
+            # Stopping games which have gone on too long, which is a truncation rather than a real end
+            truncated[gameIdx] = (
+                not checkmate
+                and self.maxMoves is not None
+                and game.moveNmb > self.maxMoves
+            )
+            if checkmate or truncated[gameIdx]:
+                self.finalStates[gameIdx] = self.getState(gameIdx)
+                game.reset()
+        return self.getStates(), self.getMasks(), rewards, dones, truncated